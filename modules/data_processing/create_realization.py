@@ -179,8 +179,11 @@ def make_dhbv2_config(
 ):
     divide_conf_df = get_model_attributes(hydrofabric)
     download_dhbv_attributes()
-    dhbv_atts = pandas.read_parquet(FilePaths.dhbv_attributes)
-    atts_df = dhbv_atts.loc[dhbv_atts["divide_id"].isin(divide_conf_df["divide_id"])]
+    # filter while reading so pyarrow can skip row groups that contain none of the divides
+    atts_df = pandas.read_parquet(
+        FilePaths.dhbv_attributes,
+        filters=[("divide_id", "in", divide_conf_df["divide_id"].tolist())],
+    )
 
     cat_config_dir = output_dir / "cat_config" / "dhbv2"
     if cat_config_dir.exists():
@@ -192,13 +195,15 @@ def make_dhbv2_config(
         divide_conf_df[["divide_id", "areasqkm", "lengthkm", "latitude"]], on="divide_id"
     )
 
+    # the same for every catchment, so only format it once
+    start_date = start_time.strftime("%Y/%m/%d")
     for _, row in merged.iterrows():
         (cat_config_dir / f"{row['divide_id']}.yml").write_text(
             template.format(
                 **row,
                 start_time=start_time,
                 end_time=end_time,
-                start_date=start_time.strftime("%Y/%m/%d"),
+                start_date=start_date,
             )
         )
 
@@ -600,7 +605,7 @@ def create_realization(
         url = f"https://communityhydrofabric.s3.us-east-1.amazonaws.com/hydrofabrics/community/gage_parameters/{gage_id}.json"
         response = requests.get(url)
         if response.status_code == 200:
-            new_template = requests.get(url).json()
+            new_template = response.json()
             template_path = paths.config_dir / "downloaded_params.json"
             with open(template_path, "w") as f:
                 json.dump(new_template, f)
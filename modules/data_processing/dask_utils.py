@@ -1,9 +1,25 @@
 import logging
+import os
 
 from dask.distributed import Client
 
 logger = logging.getLogger(__name__)
 
+# reading zarr chunks from s3 is bound by the number of requests in flight, not the cpu,
+# so for loading one in-process worker with lots of threads beats a worker process per core
+WORKER_THREADS = int(os.environ.get("NGIAB_DASK_THREADS", 32))
+
+
+def start_client(threaded: bool = False) -> Client:
+    """
+    Start a local cluster.
+    If threaded, a single worker with WORKER_THREADS threads runs in this process, for loading
+    data from s3. Otherwise dask's default worker processes are used, for cpu bound work.
+    """
+    if threaded:
+        return Client(processes=False, n_workers=1, threads_per_worker=WORKER_THREADS)
+    return Client()
+
 
 def shutdown_cluster():
     try:
@@ -55,7 +71,33 @@ def use_cluster(func):
         try:
             client = Client.current()
         except ValueError:
-            client = Client()
+            client = start_client()
+        result = func(*args, **kwargs)
+        return result
+
+    return wrapper
+
+
+def use_threaded_cluster(func):
+    """
+    Decorator that ensures the wrapped function has access to a Dask cluster for loading from s3.
+
+    If a Dask cluster is already running, it uses the existing one.
+    If no cluster is available, it creates a threaded in-process one (see start_client)
+    before executing the function. The cluster remains active after the function completes.
+
+    Parameters:
+        func: The function to be executed with a Dask cluster
+
+    Returns:
+        wrapper: The wrapped function with access to a Dask cluster
+    """
+
+    def wrapper(*args, **kwargs):
+        try:
+            Client.current()
+        except ValueError:
+            start_client(threaded=True)
         result = func(*args, **kwargs)
         return result
 
@@ -83,7 +125,7 @@ def temp_cluster(func):
             client = Client.current()
         except ValueError:
             cluster_was_running = False
-            client = Client()
+            client = start_client()
         result = func(*args, **kwargs)
         if not cluster_was_running:
             client.shutdown()
@@ -2,7 +2,7 @@ import logging
 import os
 from datetime import datetime
 from pathlib import Path
-from typing import Literal, Tuple, Union
+from typing import Dict, Literal, Optional, Tuple, Union
 
 import geopandas as gpd
 import numpy as np
@@ -79,6 +79,23 @@ def validate_time_range(dataset: xr.Dataset, start_time: str, end_time: str) ->
     return start_time, end_time
 
 
+def coordinate_slice(values: np.ndarray, start: float, stop: float) -> slice:
+    """
+    Get the integer slice of a sorted coordinate array covering start to stop (inclusive).
+    Works for ascending and descending coordinates.
+    """
+    low, high = min(start, stop), max(start, stop)
+    if values[0] > values[-1]:
+        # search the ascending view and flip the indices back
+        ascending = values[::-1]
+        first = np.searchsorted(ascending, low, side="left")
+        last = np.searchsorted(ascending, high, side="right")
+        return slice(len(values) - last, len(values) - first)
+    first = np.searchsorted(values, low, side="left")
+    last = np.searchsorted(values, high, side="right")
+    return slice(first, last)
+
+
 def clip_dataset_to_bounds(
     dataset: xr.Dataset,
     bounds: Tuple[float, float, float, float] | np.ndarray[tuple[int], np.dtype[np.float64]],
@@ -107,15 +124,15 @@ def clip_dataset_to_bounds(
     """
     # check time range here in case just this function is imported and not the whole module
     start_time, end_time = validate_time_range(dataset, start_time, end_time)
-    samplex = dataset.x.values[:2]
-    intervalx = samplex[1] - samplex[0]
-    sampley = dataset.y.values[:2]
-    intervaly = sampley[1] - sampley[0]
-    dataset = dataset.sel(
-        x=slice(bounds[0]-intervalx, bounds[2]+intervalx),
-        y=slice(bounds[1]-intervaly, bounds[3]+intervaly),
-        time=slice(start_time, end_time),
-    )
+    # binary search the coordinates for integer indices instead of label based selection
+    x_values = dataset.x.values
+    intervalx = abs(x_values[1] - x_values[0])
+    y_values = dataset.y.values
+    intervaly = abs(y_values[1] - y_values[0])
+    dataset = dataset.isel(
+        x=coordinate_slice(x_values, bounds[0] - intervalx, bounds[2] + intervalx),
+        y=coordinate_slice(y_values, bounds[1] - intervaly, bounds[3] + intervaly),
+    ).sel(time=slice(start_time, end_time))
     logger.info("Selected time range and clipped to bounds")
     return dataset
 
@@ -125,6 +142,7 @@ def save_dataset(
     ds_to_save: xr.Dataset,
     target_path: Path,
     engine: Literal["netcdf4", "scipy"] = "netcdf4",
+    encoding: Optional[Dict[str, Dict]] = None,
 ):
     """
     Helper function to compute and save an xarray.Dataset (specifically, the raw
@@ -135,12 +153,11 @@ def save_dataset(
         target_path.parent.mkdir(parents=True, exist_ok=True)
 
     temp_file_path = target_path.with_name(target_path.name + ".saving.nc")
-    if temp_file_path.exists():
-        os.remove(temp_file_path)
+    temp_file_path.unlink(missing_ok=True)
 
     client = Client.current()
     future: Future = client.compute(
-        ds_to_save.to_netcdf(temp_file_path, engine=engine, compute=False)
+        ds_to_save.to_netcdf(temp_file_path, engine=engine, encoding=encoding, compute=False)
     )  # type: ignore
     logger.debug(
         f"NetCDF write task submitted to Dask. Waiting for completion to {temp_file_path}..."
@@ -159,15 +176,18 @@ def save_to_cache(stores: xr.Dataset, cached_nc_path: Path) -> xr.Dataset:
     """
     logger.debug(f"Processing dataset for caching. Final cache target: {cached_nc_path}")
 
-    # lasily cast all numbers to f32
-    for name, var in stores.data_vars.items():
-        if np.issubdtype(var.dtype, np.number):
-            stores[name] = var.astype("float32", casting="same_kind")
+    # lazily cast all numbers to f32 as they're written rather than adding a cast to the dask graph
+    encoding = {
+        name: {"dtype": "float32"}
+        for name, var in stores.data_vars.items()
+        if np.issubdtype(var.dtype, np.number)
+    }
 
     # save dataset locally before manipulating it
-    save_dataset(stores, cached_nc_path)
+    save_dataset(stores, cached_nc_path, encoding=encoding)
 
-    stores = xr.open_mfdataset(cached_nc_path, parallel=True, engine="netcdf4")
+    # a single file, so skip the open_mfdataset combine machinery. chunks={} keeps it lazy
+    stores = xr.open_dataset(cached_nc_path, engine="netcdf4", chunks={})
     return stores
 
 
@@ -187,7 +207,7 @@ def check_local_cache(
     logger.info("Found cached nc file")
     # open the cached file and check that the time range is correct
     try:
-        cached_data = xr.open_mfdataset(cached_nc_path, parallel=True, engine="netcdf4")
+        cached_data = xr.open_dataset(cached_nc_path, engine="netcdf4", chunks={})
     except:
         logger.info("Cache produced with outdated backend, redownloading")
         return
@@ -208,10 +228,8 @@ def check_local_cache(
         logger.warning("Requested time range not in cache")
         return
 
-    cached_vars = cached_data.data_vars.keys()
-    forcing_vars = remote_dataset.data_vars.keys()
-    # replace rainrate with precip
-    missing_vars = set(forcing_vars) - set(cached_vars)
+    # data_vars keys are set-like, so compare them directly without copying into sets
+    missing_vars = remote_dataset.data_vars.keys() - cached_data.data_vars.keys()
     if len(missing_vars) > 0:
         logger.warning(f"Missing forcing vars in cache: {missing_vars}")
         return
@@ -1,16 +1,37 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Optional
 
 import s3fs
 import xarray as xr
-from data_processing.dask_utils import use_cluster
+from data_processing.dask_utils import use_threaded_cluster
 from data_processing.dataset_utils import validate_dataset_format
 from data_processing.s3fs_utils import S3ParallelFileSystem
 
 logger = logging.getLogger(__name__)
 
 
-@use_cluster
+def open_stores_on_shared_grid(stores: list[s3fs.S3Map]) -> xr.Dataset:
+    """
+    Open zarr stores that hold different variables on the same x, y and time grid.
+    Only the first store's coordinates are read; they are reused for every other store
+    instead of being fetched and compared once per store.
+    """
+    first = xr.open_dataset(stores[0], engine="zarr", chunks={})
+    shared = list(first.coords) + ["crs"]
+    # with the coordinates dropped there are no times left to decode in the other stores
+    open_without_coords = partial(
+        xr.open_dataset, engine="zarr", chunks={}, drop_variables=shared, decode_times=False
+    )
+    # each open is a few round trips to s3 for metadata, so open the rest concurrently
+    with ThreadPoolExecutor(max_workers=max(1, len(stores) - 1)) as executor:
+        others = list(executor.map(open_without_coords, stores[1:]))
+    # override skips aligning the coordinates, they come from the first store
+    return xr.merge([first, *others], join="override", compat="override")
+
+
+@use_threaded_cluster
 def load_v3_retrospective_zarr(forcing_vars: Optional[list[str]] = None) -> xr.Dataset:
     """Load zarr datasets from S3 within the specified time range."""
     # if a LocalCluster is not already running, start one
@@ -23,9 +44,8 @@ def load_v3_retrospective_zarr(forcing_vars: Optional[list[str]] = None) -> xr.D
     # default cache is readahead which is detrimental to performance in this case
     fs = S3ParallelFileSystem(anon=True, default_cache_type="none")  # default_block_size
     s3_stores = [s3fs.S3Map(url, s3=fs) for url in s3_urls]
-    # the cache option here just holds accessed data in memory to prevent s3 being queried multiple times
-    # most of the data is read once and written to disk but some of the coordinate data is read multiple times
-    dataset = xr.open_mfdataset(s3_stores, parallel=True, engine="zarr", cache=True)  # type: ignore
+    # every variable is its own store on the same grid, so the coordinates are only read once
+    dataset = open_stores_on_shared_grid(s3_stores)
 
     # set the crs attribute to conform with the format
     esri_pe_string = dataset.crs.esri_pe_string
@@ -50,7 +70,7 @@ def load_v3_retrospective_zarr(forcing_vars: Optional[list[str]] = None) -> xr.D
     return dataset
 
 
-@use_cluster
+@use_threaded_cluster
 def load_aorc_zarr(start_year: Optional[int] = None, end_year: Optional[int] = None) -> xr.Dataset:
     """Load the aorc zarr dataset from S3."""
     if not start_year or not end_year:
@@ -79,7 +99,7 @@ def load_aorc_zarr(start_year: Optional[int] = None, end_year: Optional[int] = N
     return dataset
 
 
-@use_cluster
+@use_threaded_cluster
 def load_swe_zarr() -> xr.Dataset:
     """Load the swe zarr dataset from S3."""
     s3_urls = ["s3://noaa-nwm-retrospective-3-0-pds/CONUS/zarr/ldasout.zarr"]
@@ -565,12 +565,14 @@ def write_outputs(forcings_dir: Path, units: dict) -> None:
 
 def setup_directories(cat_id: str) -> FilePaths:
     forcing_paths = FilePaths(cat_id)
-    # delete everything in the forcing folder except the cached nc file
-    for file in forcing_paths.forcings_dir.glob("*.*"):
-        if file != forcing_paths.cached_nc_file:
-            file.unlink()
-
     os.makedirs(forcing_paths.forcings_dir / "temp", exist_ok=True)
+    # delete everything in the forcing folder except the cached nc file
+    # scandir entries carry the name and type, so no Path objects or stat calls are needed per file
+    cached_nc_name = forcing_paths.cached_nc_file.name
+    with os.scandir(forcing_paths.forcings_dir) as entries:
+        for entry in entries:
+            if "." in entry.name and entry.name != cached_nc_name and entry.is_file():
+                os.unlink(entry.path)
 
     return forcing_paths
 
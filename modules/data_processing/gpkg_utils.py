@@ -1,9 +1,12 @@
 import logging
 import sqlite3
-import struct
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
+import numpy as np
 import pyproj
 from data_processing.file_paths import FilePaths
 from shapely.geometry import Point
@@ -28,6 +31,21 @@ class GeoPackage:
         self.conn.close()
 
 
+@contextmanager
+def bulk_write(con: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    Run every write made inside the block in a single transaction.
+    Committing once at the end instead of after every insert avoids an fsync per table.
+    """
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+    except BaseException:
+        con.rollback()
+        raise
+    con.commit()
+
+
 def verify_indices(gpkg: Path = FilePaths.conus_hydrofabric) -> None:
     """
     Verify that the indices in the specified geopackage are correct.
@@ -52,17 +70,23 @@ def verify_indices(gpkg: Path = FilePaths.conus_hydrofabric) -> None:
         'CREATE INDEX "ntid" ON "network" ( "toid" ASC );',
         # no vpu index because the 1s query execution is tiny compared to the next steps
     ]
+    # the index name is the first quoted string in each statement
+    wanted = {index.split('"')[1]: index for index in new_indicies}
     # check if the gpkg has the correct indices
+    # let sqlite do the comparison rather than pulling every index name (including rtree ones) into python
     con = sqlite3.connect(gpkg)
-    indices = con.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
-    indices = [x[0] for x in indices]
-    missing = [x for x in new_indicies if x.split('"')[1] not in indices]
+    con.execute("CREATE TEMP TABLE wanted_indices (name TEXT PRIMARY KEY)")
+    con.executemany("INSERT INTO temp.wanted_indices VALUES (?)", [(name,) for name in wanted])
+    missing = con.execute(
+        "SELECT name FROM temp.wanted_indices WHERE name NOT IN "
+        "(SELECT name FROM sqlite_master WHERE type = 'index')"
+    ).fetchall()
+    con.execute("DROP TABLE temp.wanted_indices")
     if len(missing) > 0:
         logger.info("Creating indices")
-    for index in new_indicies:
-        if index.split('"')[1] not in indices:
-            logger.info(f"Creating index {index}")
-            con.execute(index)
+        for (name,) in missing:
+            logger.info(f"Creating index {wanted[name]}")
+            con.execute(wanted[name])
             con.commit()
         # pragma optimize after creating the indices
         con.execute("PRAGMA optimize;")
@@ -93,54 +117,59 @@ def add_triggers_to_gpkg(gpkg: Path) -> None:
     logger.debug(f"Added triggers to subset gpkg {gpkg}")
 
 
-def blob_to_geometry(blob: bytes) -> BaseGeometry | None:
+# envelope size in bytes, indexed by the envelope type in the header flags
+# 0: none, 1: xy, 2: xyz, 3: xym, 4: xyzm
+GPKG_ENVELOPE_SIZES = (0, 32, 48, 48, 64)
+
+
+def parse_blob_header(blob: bytes) -> Tuple[int, np.ndarray] | None:
     """
-    Convert a blob to a geometry.
+    Parse the header of a geopackage binary blob.
     from http://www.geopackage.org/spec/#gpb_format
     byte 0-2 don't need
     byte 3 bit 0 (bit 24)= 0 for little endian, 1 for big endian (used for srs id and envelope type)
     byte 3 bit 1-3 (bit 25-27)= envelope type (needed to calculate envelope size)
     byte 3 bit 4 (bit 28)= empty geometry flag
+
+    Returns:
+        (header length in bytes, envelope as an array of doubles) or None if the geometry is empty.
+    """
+    flags = blob[3]
+    if flags & 0x10:
+        return None
+    envelope_size = GPKG_ENVELOPE_SIZES[(flags >> 1) & 0x7]
+    byte_order = ">" if flags & 1 else "<"
+    envelope = np.frombuffer(blob, dtype=f"{byte_order}f8", count=envelope_size // 8, offset=8)
+    return 8 + envelope_size, envelope
+
+
+def blob_to_geometry(blob: bytes) -> BaseGeometry | None:
+    """
+    Convert a geopackage binary blob to a geometry.
     """
-    envelope_type = (blob[3] & 14) >> 1
-    empty = (blob[3] & 16) >> 4
-    if empty:
+    header = parse_blob_header(blob)
+    if header is None:
         return None
-    envelope_sizes = [0, 32, 48, 48, 64]
-    envelope_size = envelope_sizes[envelope_type]
-    header_byte_length = 8 + envelope_size
+    header_byte_length, _ = header
     # everything after the header is the geometry
     geom = blob[header_byte_length:]
-    # convert to hex
     geometry = loads(geom)
     return geometry
 
 
 def blob_to_centre_point(blob: bytes) -> Point | None:
     """
-    Convert a blob to a geometry.
-    from http://www.geopackage.org/spec/#gpb_format
-    byte 0-2 don't need
-    byte 3 bit 0 (bit 24)= 0 for little endian, 1 for big endian (used for srs id and envelope type)
-    byte 3 bit 1-3 (bit 25-27)= envelope type (needed to calculate envelope size)
-    byte 3 bit 4 (bit 28)= empty geometry flag
+    Convert a geopackage binary blob to the centre point of its envelope.
     """
-    envelope_type = (blob[3] & 14) >> 1
-    empty = (blob[3] & 16) >> 4
-    if empty:
+    header = parse_blob_header(blob)
+    if header is None:
         return None
-    envelope_sizes = [0, 32, 48, 48, 64]
-    envelope_size = envelope_sizes[envelope_type]
-    header_byte_length = 8 + envelope_size
-    # everything after the header is the geometry
-    envelope = blob[8:header_byte_length]
-    if envelope_type != 1:
+    _, envelope = header
+    if len(envelope) < 4:
         logger.error(blob)
         raise Exception("Envelope type not supported")
-    minx = struct.unpack("d", envelope[0:8])[0]
-    maxx = struct.unpack("d", envelope[8:16])[0]
-    miny = struct.unpack("d", envelope[16:24])[0]
-    maxy = struct.unpack("d", envelope[24:32])[0]
+    # every envelope type starts with minx, maxx, miny, maxy
+    minx, maxx, miny, maxy = envelope[:4]
     x = (minx + maxx) / 2
     y = (miny + maxy) / 2
 
@@ -160,6 +189,26 @@ def convert_to_5070(shapely_geometry: Point) -> Point:
     return new_geometry
 
 
+# sqlite connections can't run statements from two threads at once
+_read_only_lock = threading.Lock()
+
+
+@lru_cache(maxsize=8)
+def _read_only_connection(gpkg: str) -> sqlite3.Connection:
+    """
+    A read only connection to a geopackage, opened once and reused for point lookups.
+    The schema is only parsed once and the page cache stays warm between queries.
+    Only use this for files that aren't rewritten while the process runs, like the hydrofabric.
+    """
+    con = sqlite3.connect(
+        f"{Path(gpkg).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False
+    )
+    con.execute("PRAGMA query_only=ON")
+    con.execute("PRAGMA mmap_size=1073741824")
+    con.execute("PRAGMA cache_size=-65536")
+    return con
+
+
 def get_catid_from_point(coords: Dict[str, float]) -> str:
     """
     Retrieves the watershed boundary ID (catid) of the watershed that contains the given point.
@@ -179,13 +228,14 @@ def get_catid_from_point(coords: Dict[str, float]) -> str:
     q = FilePaths.conus_hydrofabric
     point = Point(coords["lng"], coords["lat"])
     point = convert_to_5070(point)
-    with sqlite3.connect(q) as con:
-        sql = f"""SELECT DISTINCT d.divide_id, d.geom
+    with _read_only_lock:
+        con = _read_only_connection(str(q))
+        sql = """SELECT DISTINCT d.divide_id, d.geom
                 FROM divides d
                 JOIN rtree_divides_geom r ON d.fid = r.id
-                WHERE r.minx <= {point.x} AND r.maxx >= {point.x}
-                AND r.miny <= {point.y} AND r.maxy >= {point.y}"""
-        results = con.execute(sql).fetchall()
+                WHERE r.minx <= :x AND r.maxx >= :x
+                AND r.miny <= :y AND r.maxy >= :y"""
+        results = con.execute(sql, {"x": point.x, "y": point.y}).fetchall()
     if len(results) == 0:
         raise IndexError(f"No watershed boundary found for {coords}")
     if len(results) > 1:
@@ -210,30 +260,22 @@ def create_rTree_table(table: str, con: sqlite3.Connection) -> None:
     con.execute(
         f'CREATE VIRTUAL TABLE "rtree_{table}_geom" USING rtree("id", "minx", "maxx", "miny", "maxy")'
     )
-    con.commit()
 
 
-def copy_rTree_tables(
-    table: str, ids: List[str], source_db: sqlite3.Connection, dest_db: sqlite3.Connection
-) -> None:
+def build_rTree_table(table: str, con: sqlite3.Connection) -> None:
     """
-    Copy rTree tables from source database to destination database.
-    This contains the spatial index for the specified table.
-    Copying it saves us from having to rebuild the index.
+    Create the rTree table for the specified table and populate it from the hydrofabric.
+    Copying the rtree rows saves us from having to rebuild the index from the geometries.
+
     Args:
         table (str): The table name.
-        ids (List[str]): The list of IDs.
-        source_db (sqlite3.Connection): The source database connection.
-        dest_db (sqlite3.Connection): The destination database connection.
+        con (sqlite3.Connection): The connection to the subset geopackage with the hydrofabric
+            attached (see attach_hydrofabric), the caller commits.
     """
-    rTree_table = f"rtree_{table}_geom"
-
-    create_rTree_table(table, dest_db)
-
-    geom_data = source_db.execute(
-        f"SELECT * FROM {rTree_table} WHERE id in ({','.join(ids)})"
-    ).fetchall()
-    insert_data(dest_db, rTree_table, geom_data)
+    create_rTree_table(table, con)
+    con.execute(f"""INSERT INTO main."rtree_{table}_geom"
+            SELECT * FROM hydrofabric."rtree_{table}_geom"
+            WHERE id IN (SELECT fid FROM main."{table}")""")
 
 
 def insert_data(con: sqlite3.Connection, table: str, contents: List[Tuple]) -> None:
@@ -251,7 +293,6 @@ def insert_data(con: sqlite3.Connection, table: str, contents: List[Tuple]) -> N
     logger.debug(f"Inserting {table}")
     placeholders = ",".join("?" * len(contents[0]))
     con.executemany(f"INSERT INTO '{table}' VALUES ({placeholders})", contents)
-    con.commit()
 
 
 def update_geopackage_metadata(gpkg: Path) -> None:
@@ -267,29 +308,36 @@ def update_geopackage_metadata(gpkg: Path) -> None:
         max_x = con.execute(f"SELECT MAX(maxx) FROM rtree_{table}_geom").fetchone()[0]
         max_y = con.execute(f"SELECT MAX(maxy) FROM rtree_{table}_geom").fetchone()[0]
         srs_id = con.execute(
-            f"SELECT srs_id FROM gpkg_geometry_columns WHERE table_name = '{table}'"
+            "SELECT srs_id FROM gpkg_geometry_columns WHERE table_name = ?", (table,)
         ).fetchone()[0]
-        sql_command = f"INSERT INTO gpkg_contents (table_name, data_type, identifier, description, last_change, min_x, min_y, max_x, max_y, srs_id) VALUES ('{table}', 'features', '{table}', '', datetime('now'), {min_x}, {min_y}, {max_x}, {max_y}, {srs_id})"
-        sql_command = sql_command.replace("None", "NULL")
-        con.execute(sql_command)
-    con.commit()
+        # None values are bound as NULL
+        con.execute(
+            "INSERT INTO gpkg_contents (table_name, data_type, identifier, description, last_change, min_x, min_y, max_x, max_y, srs_id) VALUES (?, 'features', ?, '', datetime('now'), ?, ?, ?, ?, ?)",
+            (table, table, min_x, min_y, max_x, max_y, srs_id),
+        )
 
     # do some gpkg spec updating
     con.execute("PRAGMA application_id = '0x47504B47'")
     con.execute("PRAGMA user_version = 10200")
-    con.commit()
 
     # update the gpkg_ogr_contents table with table_name and number of features
     for table in tables:
         num_features = con.execute(f"SELECT COUNT(*) FROM '{table}'").fetchone()[0]
         con.execute(
-            f"INSERT INTO gpkg_ogr_contents (table_name, feature_count) VALUES ('{table}', {num_features})"
+            "INSERT INTO gpkg_ogr_contents (table_name, feature_count) VALUES (?, ?)",
+            (table, num_features),
         )
 
+    con.commit()
     con.close()
 
 
-def subset_table_by_vpu(table: str, vpu: str, hydrofabric: Path, subset_gpkg_name: Path) -> None:
+def subset_table_by_vpu(
+    table: str,
+    vpu: str,
+    dest_db: sqlite3.Connection,
+    feature_tables: Optional[Set[str]] = None,
+) -> None:
     """
     Subset the specified table from the hydrofabric database by vpuid and save it to the subset geopackage.
     vpus can be selected by section or as a whole e.g. 03=03N,03S,03W
@@ -297,12 +345,13 @@ def subset_table_by_vpu(table: str, vpu: str, hydrofabric: Path, subset_gpkg_nam
     Args:
         table (str): The table name.
         vpu (str): The VPU ID. e.g. 01,02,03N,03S,03W,04,05,06,07,08,09,10L,10U,11,12,13,14,15,16,17,18
-        hydrofabric (Path): The path to the hydrofabric database.
-        subset_gpkg_name (Path): The name of the subset geopackage.
+        dest_db (sqlite3.Connection): The connection to the subset geopackage with the hydrofabric
+            attached (see attach_hydrofabric), the caller commits.
+        feature_tables (Set[str], optional): The tables containing geometries, looked up if not provided.
     """
-    logger.debug(f"Subsetting {table} in {subset_gpkg_name}")
-    source_db = sqlite3.connect(f"file:{hydrofabric}?mode=ro", uri=True)
-    dest_db = sqlite3.connect(subset_gpkg_name)
+    if feature_tables is None:
+        feature_tables = set(get_feature_tables(FilePaths.conus_hydrofabric))
+    logger.debug(f"Subsetting {table}")
 
     if vpu == "03":
         vpus = ["03N", "03S", "03W"]
@@ -311,19 +360,19 @@ def subset_table_by_vpu(table: str, vpu: str, hydrofabric: Path, subset_gpkg_nam
     else:
         vpus = [vpu]
 
-    vpus = [f"'{x}'" for x in vpus]
     # in hf v2.2 every table has a vpuid column so subsetting is much easier
-    sql_query = f"SELECT * FROM '{table}' WHERE vpuid IN ({','.join(vpus)})"
-    contents = source_db.execute(sql_query).fetchall()
+    placeholders = ",".join("?" * len(vpus))
+    selected_rows = f'FROM hydrofabric."{table}" WHERE vpuid IN ({placeholders})'
 
     if table == "network":
+        contents = dest_db.execute(f"SELECT * {selected_rows}", vpus).fetchall()
         # Look for the network entry that has a toid not in the flowpath or nexus tables
         network_toids = [x[2] for x in contents]
         logger.debug(f"Network toids: {len(network_toids)}")
-        sql = "SELECT id FROM flowpaths"
+        sql = "SELECT id FROM main.flowpaths"
         flowpath_ids = [x[0] for x in dest_db.execute(sql).fetchall()]
         logger.debug(f"Flowpath ids: {len(flowpath_ids)}")
-        sql = "SELECT id FROM nexus"
+        sql = "SELECT id FROM main.nexus"
         nexus_ids = [x[0] for x in dest_db.execute(sql).fetchall()]
         logger.debug(f"Nexus ids: {len(nexus_ids)}")
         bad_ids = set(network_toids) - set(flowpath_ids + nexus_ids)
@@ -331,69 +380,93 @@ def subset_table_by_vpu(table: str, vpu: str, hydrofabric: Path, subset_gpkg_nam
         logger.info(f"Removing {len(bad_ids)} network entries that are not in flowpaths or nexuses")
         # id column is second after fid
         contents = [x for x in contents if x[1] not in bad_ids]
+        insert_data(dest_db, table, contents)
+    else:
+        dest_db.execute(f'INSERT INTO main."{table}" SELECT * {selected_rows}', vpus)
 
-    insert_data(dest_db, table, contents)
+    if table in feature_tables:
+        build_rTree_table(table, dest_db)
 
-    if table in get_feature_tables(FilePaths.conus_hydrofabric):
-        fids = [str(x[0]) for x in contents]
-        copy_rTree_tables(table, fids, source_db, dest_db)
 
-    dest_db.commit()
-    source_db.close()
-    dest_db.close()
+def attach_hydrofabric(dest_db: sqlite3.Connection, hydrofabric: Path) -> None:
+    """
+    Attach the hydrofabric to a subset geopackage connection as the "hydrofabric" schema.
+    Tables can then be copied with INSERT ... SELECT without the rows passing through python.
+    This can't be done inside a transaction.
+    The hydrofabric is attached read only, otherwise the write transaction would lock it and
+    block any other subset running at the same time.
 
+    Args:
+        dest_db (sqlite3.Connection): The connection to the subset geopackage, opened with uri=True.
+        hydrofabric (Path): The path to the hydrofabric database.
+    """
+    hydrofabric_uri = f"{Path(hydrofabric).resolve().as_uri()}?mode=ro"
+    dest_db.execute("ATTACH DATABASE ? AS hydrofabric", (hydrofabric_uri,))
 
-def subset_table(table: str, ids: List[str], hydrofabric: Path, subset_gpkg_name: Path) -> None:
+
+def load_subset_ids(table: str, ids: List[str], dest_db: sqlite3.Connection) -> None:
     """
-    Subset the specified table from the hydrofabric database and save it to the subset geopackage.
+    Fill temp.subset_ids with the ids used to subset the specified table.
+    Some tables are subset using the contents of tables already written to the subset geopackage.
 
     Args:
         table (str): The table name.
-        ids (List[str]): The list of IDs.
-        hydrofabric (str): The path to the hydrofabric database.
-        subset_gpkg_name (str): The name of the subset geopackage.
+        ids (List[str]): The list of nexus and waterbody IDs being subset.
+        dest_db (sqlite3.Connection): The connection to the subset geopackage.
     """
-    logger.debug(f"Subsetting {table} in {subset_gpkg_name}")
-    source_db = sqlite3.connect(f"file:{hydrofabric}?mode=ro", uri=True)
-    dest_db = sqlite3.connect(subset_gpkg_name)
-
-    table_keys = {"divide-attributes": "divide_id", "lakes": "poi_id"}
+    dest_db.execute("CREATE TEMP TABLE IF NOT EXISTS subset_ids (id TEXT PRIMARY KEY)")
+    dest_db.execute("DELETE FROM temp.subset_ids")
 
     if table == "lakes":
         # lakes subset we get from the pois table which was already subset by water body id
-        sql_query = "SELECT poi_id FROM 'pois'"
-        contents = dest_db.execute(sql_query).fetchall()
-        ids = [str(x[0]) for x in contents]
+        dest_db.execute("INSERT OR IGNORE INTO temp.subset_ids SELECT poi_id FROM main.pois")
+        return
 
     if table == "divide-attributes":
         # get the divide ids from the divides that have been subset already
-        sql_query = "SELECT divide_id FROM 'divides'"
-        contents = dest_db.execute(sql_query).fetchall()
-        ids = [str(x[0]) for x in contents]
+        dest_db.execute("INSERT OR IGNORE INTO temp.subset_ids SELECT divide_id FROM main.divides")
+        return
+
+    dest_db.executemany("INSERT OR IGNORE INTO temp.subset_ids VALUES (?)", ((x,) for x in ids))
 
-    if table == "nexus":
+    if table in ["nexus", "pois", "network"]:
         # add the nexuses in the toid column from the flowpaths table
-        sql_query = "SELECT toid FROM 'flowpaths'"
-        contents = dest_db.execute(sql_query).fetchall()
-        new_ids = [str(x[0]) for x in contents]
-        ids.extend(new_ids)
+        dest_db.execute(
+            "INSERT OR IGNORE INTO temp.subset_ids SELECT toid FROM main.flowpaths WHERE toid IS NOT NULL"
+        )
 
-    ids = [f"'{x}'" for x in ids]
-    key_name = "id"
-    if table in table_keys:
-        key_name = table_keys[table]
-    sql_query = f"SELECT * FROM '{table}' WHERE {key_name} IN ({','.join(ids)})"
-    contents = source_db.execute(sql_query).fetchall()
 
-    insert_data(dest_db, table, contents)
+def subset_table(
+    table: str,
+    ids: List[str],
+    dest_db: sqlite3.Connection,
+    feature_tables: Optional[Set[str]] = None,
+) -> None:
+    """
+    Subset the specified table from the hydrofabric database and save it to the subset geopackage.
+    The rows are copied inside sqlite by joining against temp.subset_ids, see load_subset_ids.
+
+    Args:
+        table (str): The table name.
+        ids (List[str]): The list of IDs.
+        dest_db (sqlite3.Connection): The connection to the subset geopackage with the hydrofabric
+            attached (see attach_hydrofabric), the caller commits.
+        feature_tables (Set[str], optional): The tables containing geometries, looked up if not provided.
+    """
+    if feature_tables is None:
+        feature_tables = set(get_feature_tables(FilePaths.conus_hydrofabric))
+    logger.debug(f"Subsetting {table}")
 
-    if table in get_feature_tables(FilePaths.conus_hydrofabric):
-        fids = [str(x[0]) for x in contents]
-        copy_rTree_tables(table, fids, source_db, dest_db)
+    table_keys = {"divide-attributes": "divide_id", "lakes": "poi_id"}
+    key_name = table_keys.get(table, "id")
 
-    dest_db.commit()
-    source_db.close()
-    dest_db.close()
+    load_subset_ids(table, ids, dest_db)
+    dest_db.execute(f"""INSERT INTO main."{table}"
+            SELECT t.* FROM hydrofabric."{table}" AS t
+            JOIN temp.subset_ids AS s ON t."{key_name}" = s.id""")
+
+    if table in feature_tables:
+        build_rTree_table(table, dest_db)
 
 
 def get_table_crs_short(gpkg: str | Path, table: str) -> str:
@@ -405,20 +478,21 @@ def get_table_crs_short(gpkg: str | Path, table: str) -> str:
         table (str): The table name.
     """
     with sqlite3.connect(gpkg) as con:
-        sql_query = f"""SELECT organization || ':' || organization_coordsys_id
+        sql_query = """SELECT organization || ':' || organization_coordsys_id
                     FROM gpkg_spatial_ref_sys
                     WHERE srs_id = (
                         SELECT srs_id
                         FROM gpkg_geometry_columns
-                        WHERE table_name = '{table}'
+                        WHERE table_name = ?
                     )"""
-        crs = con.execute(sql_query).fetchone()[0]
+        crs = con.execute(sql_query, (table,)).fetchone()[0]
     return crs
 
 
 def get_table_crs(gpkg: str, table: str) -> str:
     """
     Get the CRS of the specified table in the specified geopackage.
+    Results are cached until the geopackage is modified.
 
     Args:
         gpkg (str): The path to the geopackage.
@@ -427,9 +501,15 @@ def get_table_crs(gpkg: str, table: str) -> str:
     Returns:
         str: The CRS of the table.
     """
+    return _query_table_crs(str(gpkg), Path(gpkg).stat().st_mtime_ns, table)
+
+
+@lru_cache(maxsize=32)
+def _query_table_crs(gpkg: str, mtime_ns: int, table: str) -> str:
+    """Cached crs lookup, mtime_ns is only part of the key so subset gpkgs rebuilt in place aren't stale"""
     con = sqlite3.connect(gpkg)
-    sql_query = f"SELECT g.definition FROM gpkg_geometry_columns AS c JOIN gpkg_spatial_ref_sys AS g ON c.srs_id = g.srs_id WHERE c.table_name = '{table}'"
-    crs = con.execute(sql_query).fetchone()[0]
+    sql_query = "SELECT g.definition FROM gpkg_geometry_columns AS c JOIN gpkg_spatial_ref_sys AS g ON c.srs_id = g.srs_id WHERE c.table_name = ?"
+    crs = con.execute(sql_query, (table,)).fetchone()[0]
     con.close()
     return crs
 
@@ -458,9 +538,9 @@ def get_cat_from_gage_id(gage_id: str, gpkg: Path = FilePaths.conus_hydrofabric)
 
     logger.info(f"Getting catid for {gage_id}, in {gpkg}")
 
-    with sqlite3.connect(gpkg) as con:
-        sql_query = f"SELECT id FROM 'flowpath-attributes' WHERE gage = '{gage_id}'"
-        result = con.execute(sql_query).fetchall()
+    with _read_only_lock:
+        sql_query = "SELECT id FROM 'flowpath-attributes' WHERE gage = ?"
+        result = _read_only_connection(str(gpkg)).execute(sql_query, (gage_id,)).fetchall()
         if len(result) == 0:
             logger.critical(f"Gage ID {gage_id} is not associated with any waterbodies")
             raise IndexError(f"Could not find a waterbody for gage {gage_id}")
@@ -498,22 +578,26 @@ def get_cat_to_nex_flowpairs(hydrofabric: Path = FilePaths.conus_hydrofabric) ->
     return unique_edges
 
 
+@lru_cache(maxsize=16)
+def _query_table_names(gpkg: str, mtime_ns: int, sql_query: str) -> Tuple[str, ...]:
+    """Cached table name lookup, mtime_ns is only part of the key so edits invalidate the cache"""
+    with sqlite3.connect(gpkg) as conn:
+        tables = conn.execute(sql_query).fetchall()
+    return tuple(i[0] for i in tables)
+
+
 def get_feature_tables(gpkg: Path) -> List[str]:
     """Takes a Path to a geopackage and returns a list of tables containing geometries."""
     sql_query = "SELECT table_name FROM gpkg_contents WHERE data_type='features'"
-    with sqlite3.connect(gpkg) as conn:
-        tables = conn.execute(sql_query).fetchall()
-    tables = [i[0] for i in tables]
-    return tables
+    gpkg = Path(gpkg)
+    return list(_query_table_names(str(gpkg), gpkg.stat().st_mtime_ns, sql_query))
 
 
 def get_available_tables(gpkg: Path) -> List[str]:
     """Takes a Path to a geopackage and returns a list of non-metadata tables. aka gpd.list_layers()"""
     sql_query = "SELECT table_name FROM gpkg_contents"
-    with sqlite3.connect(gpkg) as conn:
-        tables = conn.execute(sql_query).fetchall()
-    tables = [i[0] for i in tables]
-    return tables
+    gpkg = Path(gpkg)
+    return list(_query_table_names(str(gpkg), gpkg.stat().st_mtime_ns, sql_query))
 
 
 def get_cat_to_nhd_feature_id(gpkg: Path = FilePaths.conus_hydrofabric) -> Dict[str, int]:
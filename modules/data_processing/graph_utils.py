@@ -1,5 +1,6 @@
 import logging
 import sqlite3
+import threading
 from functools import cache
 from pathlib import Path
 from typing import List, Optional, Set, Union
@@ -8,6 +9,8 @@ import igraph as ig
 from data_processing.file_paths import FilePaths
 
 logger = logging.getLogger(__name__)
+# held while the graph loads, so a request that arrives during the warmup waits for it
+_graph_lock = threading.Lock()
 
 
 def get_from_to_id_pairs(
@@ -85,17 +88,23 @@ def create_graph_from_gpkg(hydrofabric: Path) -> ig.Graph:
     return graph
 
 
-@cache
 def get_graph() -> ig.Graph:
     """
     Attempts to load a graph from a pickled file; if unavailable, creates it from the geopackage.
 
     This function first checks if a pickled version of the graph exists. If not, it creates a new graph
     by reading hydrological data from a geopackage file and then pickles the newly created graph for future use.
+    The graph is only loaded once, concurrent callers wait for the first load to finish.
 
     Returns:
         ig.Graph: The hydrological network graph.
     """
+    with _graph_lock:
+        return _load_graph()
+
+
+@cache
+def _load_graph() -> ig.Graph:
     pickled_graph_path = FilePaths.hydrofabric_graph
     if not pickled_graph_path.exists():
         logger.debug("Graph pickle does not exist, creating a new graph.")
@@ -203,7 +212,11 @@ def get_upstream_ids(names: Union[str, List[str]], include_outlet: bool = True)
     parent_ids = set()
     for name in names:
         if ("wb" in name or "cat" in name) and include_outlet:
-            name = get_outlet_id(name)
+            try:
+                name = get_outlet_id(name)
+            except (KeyError, ValueError):
+                logger.error(f"feature {name} not found in the hydrofabric graph.")
+                continue
         if name in parent_ids:
             continue
         try:
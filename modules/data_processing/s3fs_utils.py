@@ -1,14 +1,23 @@
 from s3fs import S3FileSystem
 from s3fs.core import _error_wrapper, version_id_kw
-from typing import Optional
+from typing import Optional, Tuple
 import asyncio
 
+# S3 range GETs are most efficient in the 8-16MB range, smaller chunks are dominated by request overhead
+CHUNK_SIZE = 16 * 1024 * 1024
+# cap the number of simultaneous range requests per object to avoid saturating the connection pool
+MAX_IN_FLIGHT = 16
+# botocore defaults to 10 pooled connections, far fewer than the dask threads each fetching chunks
+MAX_POOL_CONNECTIONS = 128
+
 
 class S3ParallelFileSystem(S3FileSystem):
     """S3FileSystem subclass that supports parallel downloads"""
 
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        config_kwargs = dict(kwargs.pop("config_kwargs", None) or {})
+        config_kwargs.setdefault("max_pool_connections", MAX_POOL_CONNECTIONS)
+        super().__init__(*args, config_kwargs=config_kwargs, **kwargs)
 
     async def _cat_file(
         self,
@@ -25,40 +34,64 @@ class S3ParallelFileSystem(S3FileSystem):
             head = {"Range": await self._process_limits(path, start, end)}
             return await self._download_chunk(bucket, key, head, version_kw)
 
-        # For large files, use parallel downloads
+        # Rather than a HEAD request to get the size, speculatively fetch the first chunk
+        # the Content-Range header of the response contains the total object size
+        # small objects are then downloaded in a single round trip
         try:
-            obj_size = (
-                await self._call_s3(
-                    "head_object", Bucket=bucket, Key=key, **version_kw, **self.req_kw
-                )
-            )["ContentLength"]
+            first_chunk, content_range = await self._download_chunk_with_range(
+                bucket, key, {"Range": f"bytes=0-{CHUNK_SIZE - 1}"}, version_kw
+            )
         except Exception:
-            # Fall back to single request if HEAD fails
+            # Fall back to single request if the ranged GET fails, e.g. for empty objects
             return await self._download_chunk(bucket, key, {}, version_kw)
 
-        CHUNK_SIZE = 5 * 1024 * 1024  # 1MB chunks
-        if obj_size <= CHUNK_SIZE:
-            return await self._download_chunk(bucket, key, {}, version_kw)
+        # Content-Range: bytes 0-16777215/123456789
+        obj_size = int(content_range.rsplit("/", 1)[-1]) if content_range else len(first_chunk)
+        if obj_size <= len(first_chunk):
+            return first_chunk
 
         # Calculate chunks for parallel download
         chunks = []
-        for start in range(0, obj_size, CHUNK_SIZE):
+        for start in range(len(first_chunk), obj_size, CHUNK_SIZE):
             end = min(start + CHUNK_SIZE - 1, obj_size - 1)
             range_header = f"bytes={start}-{end}"
-            chunks.append({"Range": range_header})
+            chunks.append((start, end, {"Range": range_header}))
+
+        # each chunk is written straight into its slice of one buffer
+        # this avoids holding every chunk plus a joined copy of the whole object in memory
+        buffer = bytearray(obj_size)
+        buffer[: len(first_chunk)] = first_chunk
+        del first_chunk
+        # Download chunks in parallel, with at most MAX_IN_FLIGHT requests at a time
+        semaphore = asyncio.Semaphore(MAX_IN_FLIGHT)
+
+        async def guarded_download(offset, last, chunk_head):
+            async with semaphore:
+                data = await self._download_chunk(bucket, key, chunk_head, version_kw)
+            # a short read would otherwise leave zeros in the middle of the object
+            if len(data) != last - offset + 1:
+                raise OSError(
+                    f"Expected {last - offset + 1} bytes from {path} at {offset}, got {len(data)}"
+                )
+            buffer[offset : last + 1] = data
 
-        # Download chunks in parallel
         async def download_all_chunks():
-            tasks = [
-                self._download_chunk(bucket, key, chunk_head, version_kw) for chunk_head in chunks
-            ]
-            chunks_data = await asyncio.gather(*tasks)
-            return b"".join(chunks_data)
+            tasks = [guarded_download(*chunk) for chunk in chunks]
+            await asyncio.gather(*tasks)
+            # return bytes like every other path through this method
+            return bytes(buffer)
 
         return await _error_wrapper(download_all_chunks, retries=self.retries)
 
     async def _download_chunk(self, bucket: str, key: str, head: dict, version_kw: dict) -> bytes:
         """Helper function to download a single chunk"""
+        data, _ = await self._download_chunk_with_range(bucket, key, head, version_kw)
+        return data
+
+    async def _download_chunk_with_range(
+        self, bucket: str, key: str, head: dict, version_kw: dict
+    ) -> Tuple[bytes, Optional[str]]:
+        """Helper function to download a single chunk, also returns the Content-Range header if present"""
 
         async def _call_and_read():
             resp = await self._call_s3(
@@ -70,7 +103,7 @@ class S3ParallelFileSystem(S3FileSystem):
                 **self.req_kw,
             )
             try:
-                return await resp["Body"].read()
+                return await resp["Body"].read(), resp.get("ContentRange")
             finally:
                 resp["Body"].close()
 
@@ -1,12 +1,16 @@
 import logging
 import os
+import sqlite3
 from pathlib import Path
-from typing import List, Union
+from typing import Iterable, List, Optional, Union
 
 from data_processing.file_paths import FilePaths
 from data_processing.gpkg_utils import (
     add_triggers_to_gpkg,
+    attach_hydrofabric,
+    bulk_write,
     create_empty_gpkg,
+    get_feature_tables,
     subset_table,
     subset_table_by_vpu,
     update_geopackage_metadata,
@@ -27,7 +31,7 @@ subset_tables = [
     "nexus",  # depends on flowpaths in some cases e.g. gage delineation
     "pois",  # requires flowpaths
     "lakes",  # requires pois
-    "network",
+    "network",  # requires flowpaths
 ]
 
 
@@ -57,16 +61,29 @@ def create_subset_gpkg(
                 console.print("Exiting...", style="bold red")
                 exit()
     else:
-        if os.path.exists(output_gpkg_path):
-            os.remove(output_gpkg_path)
+        output_gpkg_path.unlink(missing_ok=True)
 
     create_empty_gpkg(output_gpkg_path)
     logger.info(f"Subsetting tables: {subset_tables}")
-    for table in subset_tables:
-        if is_vpu:
-            subset_table_by_vpu(table, ids[0], hydrofabric, output_gpkg_path)
-        else:
-            subset_table(table, ids, hydrofabric, output_gpkg_path)
+    feature_tables = set(get_feature_tables(FilePaths.conus_hydrofabric))
+    # uri=True lets the hydrofabric be attached read only
+    dest_db = sqlite3.connect(output_gpkg_path, uri=True)
+    # the subset gpkg is rebuilt from scratch if anything fails, so durability isn't needed while writing
+    dest_db.execute("PRAGMA cache_size = -524288")  # 512MB
+    dest_db.execute("PRAGMA synchronous = OFF")
+    dest_db.execute("PRAGMA journal_mode = MEMORY")
+    dest_db.execute("PRAGMA temp_store = MEMORY")
+    # one connection reads the hydrofabric and writes the subset, so its page cache and
+    # prepared statement cache are reused for every table
+    attach_hydrofabric(dest_db, hydrofabric)
+    # write every table in one transaction
+    with bulk_write(dest_db):
+        for table in subset_tables:
+            if is_vpu:
+                subset_table_by_vpu(table, ids[0], dest_db, feature_tables)
+            else:
+                subset_table(table, ids, dest_db, feature_tables)
+    dest_db.close()
 
     add_triggers_to_gpkg(output_gpkg_path)
     update_geopackage_metadata(output_gpkg_path)
@@ -99,16 +116,22 @@ def subset(
     output_gpkg_path: Path = Path(),
     include_outlet: bool = True,
     override_gpkg: bool = True,
+    upstream_ids: Optional[Iterable[str]] = None,
 ):
-    upstream_ids = list(get_upstream_ids(cat_ids, include_outlet))
+    # upstream_ids can be passed in if the caller has already walked the graph for cat_ids
+    if upstream_ids is None:
+        upstream_ids = get_upstream_ids(cat_ids, include_outlet)
+    upstream_ids = list(upstream_ids)
 
     if not output_gpkg_path:
         # if the name isn't provided, use the first upstream id
-        upstream_ids = sorted(upstream_ids)
-        output_folder_name = upstream_ids[0]
+        # min is a single pass, the table order doesn't depend on the order of the ids
+        output_folder_name = min(upstream_ids)
         paths = FilePaths(output_folder_name)
         output_gpkg_path = paths.geopackage_path
 
     create_subset_gpkg(upstream_ids, hydrofabric, output_gpkg_path, override_gpkg=override_gpkg)
     logger.info(f"Subset complete for {len(upstream_ids)} features (catchments + nexuses)")
-    logger.debug(f"Subset complete for {upstream_ids} catchments")
+    # formatting every id is expensive for large subsets, only do it if it will be logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Subset complete for {upstream_ids} catchments")
@@ -1,10 +1,15 @@
-import gzip
+import hashlib
 import json
 import os
+import shutil
 import sqlite3
+import subprocess
 import tarfile
+import threading
 import warnings
-from time import sleep
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from time import monotonic, time
 
 import boto3
 import botocore
@@ -13,7 +18,7 @@ import requests
 from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from data_processing.file_paths import FilePaths
-from data_processing.gpkg_utils import verify_indices
+from rich import filesize
 from rich.console import Console
 from rich.progress import (
     BarColumn,
@@ -27,6 +32,18 @@ from rich.progress import (
 from rich.prompt import Prompt
 from tqdm import TqdmExperimentalWarning
 
+try:
+    # ISA-L's SIMD inflate is 2-3x faster than zlib, optional as it needs a compiled wheel
+    from isal import igzip_threaded
+except ImportError:
+    igzip_threaded = None
+
+try:
+    # rapidgzip splits a single gzip stream at deflate block boundaries and inflates on every core
+    import rapidgzip
+except ImportError:
+    rapidgzip = None
+
 warnings.filterwarnings("ignore", category=TqdmExperimentalWarning)
 
 console = Console()
@@ -34,6 +51,12 @@ S3_BUCKET = "communityhydrofabric"
 S3_KEY = "hydrofabrics/community/conus_nextgen.tar.gz"
 S3_REGION = "us-east-1"
 hydrofabric_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{S3_KEY}"
+# how many times a corrupted hydrofabric is downloaded again before giving up
+HF_DOWNLOAD_ATTEMPTS = 3
+# reuse the connection to the bucket for every HEAD request
+session = requests.Session()
+# a request already in flight on another thread is waited for rather than sent again
+_head_lock = threading.Lock()
 
 
 def decompress_gzip_tar(file_path, output_dir):
@@ -45,25 +68,193 @@ def decompress_gzip_tar(file_path, output_dir):
     )
     task = progress.add_task("Decompressing", total=1)
     with progress:
-        with gzip.open(file_path, "rb") as f_in:
-            with tarfile.open(fileobj=f_in) as tar:
-                # Extract all contents
-                for member in tar:
-                    tar.extract(member, path=output_dir)
-                    progress.update(task, advance=1 / len(tar.getmembers()))
-
-
-def download_from_s3(save_path, bucket=S3_BUCKET, key=S3_KEY, region=S3_REGION):
-    """Download file from S3 with optimal multipart configuration"""
-    if not os.path.exists(os.path.dirname(save_path)):
-        os.makedirs(os.path.dirname(save_path))
-
-    # Check if file already exists
-    if os.path.exists(save_path):
-        console.print(f"File already exists: {save_path}", style="bold yellow")
-        os.remove(save_path)
-
-    client_config = botocore.config.Config(max_pool_connections=75)
+        # rapidgzip is tried first as it's the only option that inflates on every core,
+        # pigz still inflates on a single thread and only moves the rest of the work off it
+        if rapidgzip is not None:
+            # the compressed position isn't known here, so report how much has been written out
+            with rapidgzip.open(str(file_path), parallelization=os.cpu_count()) as f_in:
+                extract_tar_stream(
+                    f_in,
+                    output_dir,
+                    on_progress=lambda n: progress.update(
+                        task, description=f"Decompressing ({filesize.decimal(n)})"
+                    ),
+                )
+            progress.update(task, completed=1)
+            return
+        if shutil.which("pigz") and shutil.which("tar"):
+            # pigz inflates on separate threads from reading, writing and checksumming
+            # and the extraction happens in tar rather than python
+            os.makedirs(output_dir, exist_ok=True)
+            with subprocess.Popen(["pigz", "-dc", str(file_path)], stdout=subprocess.PIPE) as pigz:
+                subprocess.run(
+                    ["tar", "-xf", "-", "-C", str(output_dir)], stdin=pigz.stdout, check=True
+                )
+                pigz.stdout.close()
+            if pigz.returncode != 0:
+                raise subprocess.CalledProcessError(pigz.returncode, pigz.args)
+            progress.update(task, completed=1)
+            return
+        # stream the archive in a single pass, random access into a gzip file means re-reading it
+        # progress is tracked by how much of the compressed file has been read
+        with open(file_path, "rb") as raw:
+            with progress.wrap_file(raw, total=os.path.getsize(file_path), task_id=task) as f_in:
+                if igzip_threaded is not None:
+                    # inflate on a background thread so it overlaps with writing the files out
+                    with igzip_threaded.open(f_in, "rb", threads=1) as gz:
+                        extract_tar_stream(gz, output_dir)
+                    return
+                extract_tar_stream(f_in, output_dir, mode="r|gz")
+
+
+def write_member(path, data, mode):
+    with open(path, "wb") as f:
+        f.write(data)
+    os.chmod(path, mode)
+
+
+def extract_tar_stream(f_in, output_dir, mode="r|", on_progress=None):
+    """Extract a tar archive read sequentially from f_in
+
+    on_progress is called with the total bytes extracted so far, at most 30 times a second.
+    """
+    output_dir = os.path.realpath(output_dir)
+    # the archive has to be read in order, but small files can be written out by a pool
+    # so the open/write/close syscalls overlap with decompressing the next member
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    seen_dirs = set()
+    pending = set()
+    extracted = 0
+    next_update = 0.0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # read 1MB at a time, the default 10KB means a lot of small decompress calls
+        with tarfile.open(fileobj=f_in, mode=mode, bufsize=1024 * 1024) as tar:
+            for member in tar:
+                if on_progress is not None and monotonic() >= next_update:
+                    on_progress(extracted)
+                    next_update = monotonic() + 1 / 30
+                extracted += member.size
+                path = os.path.realpath(os.path.join(output_dir, member.name))
+                if os.path.commonpath([output_dir, path]) != output_dir:
+                    raise tarfile.TarError(f"{member.name} would extract outside {output_dir}")
+                if member.isdir():
+                    if path not in seen_dirs:
+                        os.makedirs(path, exist_ok=True)
+                        seen_dirs.add(path)
+                    continue
+                if not member.isfile():
+                    continue
+                parent = os.path.dirname(path)
+                if parent not in seen_dirs:
+                    os.makedirs(parent, exist_ok=True)
+                    seen_dirs.add(parent)
+                source = tar.extractfile(member)
+                if member.size > 16 * 1024 * 1024:
+                    # large files like the gpkg itself are copied straight to disk, not buffered
+                    with open(path, "wb") as f:
+                        shutil.copyfileobj(source, f, 1024 * 1024)
+                    os.chmod(path, member.mode)
+                    continue
+                # bound the number of buffered files waiting to be written
+                if len(pending) >= max_workers * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(pool.submit(write_member, path, source.read(), member.mode))
+        for future in pending:
+            future.result()
+    if on_progress is not None:
+        on_progress(extracted)
+
+
+class TeeWriter:
+    """Non seekable file object that writes to several files, so boto3 writes the parts in order"""
+
+    def __init__(self, *files):
+        self.files = files
+
+    def write(self, data):
+        for f in self.files:
+            f.write(data)
+        return len(data)
+
+
+def extract_from_pipe(fd, output_dir, errors, on_progress=None):
+    """Extract a gzipped tar archive from the read end of a pipe, collecting errors for the caller"""
+    with os.fdopen(fd, "rb") as f_in:
+        try:
+            if igzip_threaded is not None:
+                with igzip_threaded.open(f_in, "rb", threads=1) as gz:
+                    extract_tar_stream(gz, output_dir, on_progress=on_progress)
+            else:
+                extract_tar_stream(f_in, output_dir, mode="r|gz", on_progress=on_progress)
+        except Exception as e:
+            errors.append(e)
+        # keep reading so the download never blocks on a full pipe
+        while f_in.read(1024 * 1024):
+            pass
+
+
+def get_local_etag(save_path) -> str:
+    """ETag of the object last downloaded to save_path by download_from_s3, empty if unknown"""
+    etag_path = f"{save_path}.etag"
+    if not os.path.exists(save_path) or not os.path.exists(etag_path):
+        return ""
+    with open(etag_path, "r") as f:
+        return f.read()
+
+
+def file_matches_etag(path, etag: str) -> bool:
+    """Check a local file against an S3 ETag by recomputing it, including multipart ETags"""
+    etag = etag.strip('"')
+    size = os.path.getsize(path)
+    if "-" not in etag:
+        # single part uploads use the md5 of the whole file
+        part_sizes = [max(size, 1)]
+    else:
+        # multipart ETags are the md5 of the concatenated part md5s, with the part count appended
+        # the part size isn't recorded, so try the power of two MB sizes tools tend to use
+        # and the smallest whole MB that fits, keeping only those that give the right part count
+        parts = int(etag.split("-")[1])
+        mb = 1024 * 1024
+        part_sizes = {2**i * mb for i in range(13)} | {-(-size // parts // mb) * mb}
+        part_sizes = sorted(p for p in part_sizes if p > 0 and -(-size // p) == parts)
+    # parts can be several GB, so each one is hashed a block at a time
+    block_size = 8 * 1024 * 1024
+    for part_size in part_sizes:
+        digests = []
+        with open(path, "rb") as f:
+            while True:
+                part_md5 = hashlib.md5(usedforsecurity=False)
+                remaining = part_size
+                while remaining and (block := f.read(min(remaining, block_size))):
+                    part_md5.update(block)
+                    remaining -= len(block)
+                if remaining == part_size:
+                    break
+                digests.append(part_md5.digest())
+        if "-" not in etag:
+            local_etag = digests[0].hex() if digests else hashlib.md5(b"").hexdigest()
+        else:
+            combined = hashlib.md5(b"".join(digests), usedforsecurity=False).hexdigest()
+            local_etag = f"{combined}-{len(digests)}"
+        if local_etag == etag:
+            return True
+    return False
+
+
+@lru_cache(maxsize=None)
+def get_s3_client(region=S3_REGION, max_pool_connections=20):
+    """Unsigned S3 client for the public buckets, shared so its connections are reused"""
+    # a stalled part is retried after a few seconds rather than holding up the
+    # whole transfer for botocore's default 60s read timeout
+    client_config = botocore.config.Config(
+        read_timeout=8,
+        connect_timeout=3,
+        retries={"max_attempts": 5, "mode": "standard"},
+        tcp_keepalive=True,
+        max_pool_connections=max_pool_connections,
+    )
     # Initialize S3 client
     s3_client = boto3.client(
         "s3",
@@ -74,27 +265,72 @@ def download_from_s3(save_path, bucket=S3_BUCKET, key=S3_KEY, region=S3_REGION):
     )
     # Disable request signing for public buckets
     s3_client._request_signer.sign = lambda *args, **kwargs: None
+    return s3_client
 
-    # Get object size
-    try:
-        response = s3_client.head_object(Bucket=bucket, Key=key)
-        total_size = int(response.get("ContentLength", 0))
-    except ClientError as e:
-        console.print(f"Error getting object info: {e}", style="bold red")
-        return False
+
+def download_from_s3(
+    save_path, bucket=S3_BUCKET, key=S3_KEY, region=S3_REGION, extract_dir=None, headers=None
+):
+    """Download file from S3 with optimal multipart configuration
+
+    If extract_dir is given the file is a gzipped tarball, and it's extracted there
+    while it downloads. headers can be the HTTP headers of an earlier HEAD request for
+    the object, saving another round trip to find its size and ETag.
+    """
+    if not os.path.exists(os.path.dirname(save_path)):
+        os.makedirs(os.path.dirname(save_path))
 
     # Configure transfer settings for maximum speed
-    # Use more CPU cores for parallel processing
+    # past ~16 connections s3 starts throttling rather than adding throughput
     cpu_count = os.cpu_count() or 8
-    max_threads = cpu_count * 4
+    max_threads = min(cpu_count * 2, 16)
+    s3_client = get_s3_client(region, max_threads + 4)
+
+    # Get object size
+    if headers and "Content-Length" in headers and "ETag" in headers:
+        total_size = int(headers["Content-Length"])
+        etag = headers["ETag"]
+    else:
+        try:
+            response = s3_client.head_object(Bucket=bucket, Key=key)
+            total_size = int(response.get("ContentLength", 0))
+        except ClientError as e:
+            console.print(f"Error getting object info: {e}", style="bold red")
+            return False
+        etag = response.get("ETag", "")
+
+    # skip the download if the file on disk is the same object, it's overwritten otherwise
+    up_to_date = (
+        etag
+        and os.path.exists(save_path)
+        and os.path.getsize(save_path) == total_size
+        and (get_local_etag(save_path) == etag or file_matches_etag(save_path, etag))
+    )
+    if up_to_date:
+        # rehashing is only needed once, record the ETag for the next run
+        with open(f"{save_path}.etag", "w") as f:
+            f.write(etag)
+        console.print(f"File already up to date: {save_path}", style="bold green")
+        if extract_dir is None:
+            return True
+        try:
+            decompress_gzip_tar(save_path, extract_dir)
+            return True
+        except Exception as e:
+            # the local copy can't be trusted, remove it and download it again below
+            console.print(
+                f"Error extracting {save_path}, downloading it again: {e}", style="bold red"
+            )
+            for path in (f"{save_path}.etag", save_path):
+                if os.path.exists(path):
+                    os.remove(path)
 
     # Optimize chunk size based on file size and available memory
     memory = psutil.virtual_memory()
     available_mem_mb = memory.available / (1024 * 1024)
 
-    # Calculate optimal chunk size (min 8MB, max 100MB)
-    # Larger files get larger chunks for better throughput
-    optimal_chunk_mb = min(max(8, total_size / (50 * 1024 * 1024)), 100)
+    # 16-64MB parts get the best throughput from s3, smaller parts spend more time on requests
+    optimal_chunk_mb = 64 if total_size > 256 * 1024 * 1024 else 16
     # Ensure we don't use too much memory
     optimal_chunk_mb = min(optimal_chunk_mb, available_mem_mb / (max_threads * 2))
 
@@ -103,37 +339,123 @@ def download_from_s3(save_path, bucket=S3_BUCKET, key=S3_KEY, region=S3_REGION):
         # multipart_threshold=8 * 1024 * 1024,  # 8MB
         max_concurrency=max_threads,
         multipart_chunksize=int(optimal_chunk_mb * 1024 * 1024),
+        # the default 256KB io chunks leave the single writer thread saturated on fast links,
+        # anything under 128KB makes it the bottleneck
+        io_chunksize=int(os.environ.get("HF_S3_IO_CHUNKSIZE", 1024 * 1024)),
+        # when extracting, the writes wait on a single inflate thread, and a deep queue would
+        # hold gigabytes of downloaded chunks in memory while it catches up
+        max_io_queue=10000 if extract_dir is None else 100,
         use_threads=True,
     )
 
     try:
-        dl_progress = Progress(BarColumn(), DownloadColumn(), TransferSpeedColumn())
+        dl_progress = Progress(
+            TextColumn("{task.description}"), BarColumn(), DownloadColumn(), TransferSpeedColumn()
+        )
         # Download file using optimized transfer config
         with dl_progress:
             task = dl_progress.add_task("Downloading...", total=total_size)
-            s3_client.download_file(
-                Bucket=bucket,
-                Key=key,
-                Filename=save_path,
-                Config=config,
-                Callback=lambda bytes_downloaded: dl_progress.update(
-                    task, advance=bytes_downloaded
-                ),
-            )
+
+            def callback(bytes_downloaded):
+                dl_progress.update(task, advance=bytes_downloaded)
+
+            if extract_dir is None:
+                s3_client.download_file(
+                    Bucket=bucket, Key=key, Filename=save_path, Config=config, Callback=callback
+                )
+            else:
+                # decompress in another thread as the data arrives, the tarball is still
+                # written to disk so it doesn't need downloading again
+                read_fd, write_fd = os.pipe()
+                errors = []
+                extract_task = dl_progress.add_task("Extracting...", total=None)
+                extractor = threading.Thread(
+                    target=extract_from_pipe,
+                    args=(read_fd, extract_dir, errors),
+                    kwargs={"on_progress": lambda n: dl_progress.update(extract_task, completed=n)},
+                )
+                extractor.start()
+                try:
+                    with open(save_path, "wb") as f, os.fdopen(write_fd, "wb") as pipe:
+                        s3_client.download_fileobj(
+                            Bucket=bucket,
+                            Key=key,
+                            Fileobj=TeeWriter(f, pipe),
+                            Config=config,
+                            Callback=callback,
+                        )
+                finally:
+                    extractor.join()
+                if errors:
+                    raise errors[0]
+        with open(f"{save_path}.etag", "w") as f:
+            f.write(etag)
         return True
     except Exception as e:
         console.print(f"Error downloading file: {e}", style="bold red")
         return False
 
 
+@lru_cache(maxsize=8)
+def _head(url: str):
+    # exceptions aren't cached, so raising on anything but a 200 means only successful
+    # responses are kept and a failed request is retried on the next call
+    response = session.head(url, timeout=5)
+    if response.status_code != 200:
+        raise requests.exceptions.HTTPError(response=response)
+    return response.status_code, response.headers
+
+
 def get_headers(url: str = hydrofabric_url):
     # for versioning
     # Useful Headers: { 'Last-Modified': 'Wed, 20 Nov 2024 18:45:59 GMT', 'ETag': '"cc1452838886a7ab3065a61073fa991b-207"'}
+    # the remote files don't change during a run, so each url is only requested once
     try:
-        response = requests.head(url)
-    except requests.exceptions.ConnectionError:
+        with _head_lock:
+            return _head(url)
+    except requests.exceptions.HTTPError as e:
+        return e.response.status_code, e.response.headers
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         return 500, {}
-    return response.status_code, response.headers
+
+
+def cache_lifetime(headers, default: int) -> int:
+    """Seconds a HEAD response can be reused for, the server's Cache-Control wins over the default"""
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name == "max-age" and value.isdigit():
+            return int(value)
+    return default
+
+
+def _cached_head(url: str = hydrofabric_url, ttl: int = 3600):
+    """get_headers, with successful responses kept on disk for ttl seconds between runs"""
+    cache_path = FilePaths.hydrofabric_download_log.with_suffix(".headcache.json")
+    try:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+        if cache["url"] == url and time() - cache["ts"] < cache["ttl"]:
+            return cache["status"], cache["headers"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    status, headers = get_headers(url)
+    lifetime = cache_lifetime(headers, ttl)
+    if status == 200 and lifetime > 0:
+        cache = {
+            "url": url,
+            "ts": time(),
+            "ttl": lifetime,
+            "status": status,
+            "headers": dict(headers),
+        }
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump(cache, f)
+    return status, headers
 
 
 def download_dhbv_attributes():
@@ -155,6 +477,7 @@ def download_dhbv_attributes():
             FilePaths.dhbv_attributes,
             bucket=S3_BUCKET,
             key=s3_key,
+            headers=headers if status == 200 else None,
         )
         with open(FilePaths.dhbv_attributes.with_suffix(".log"), "w") as f:
             json.dump(dict(headers), f)
@@ -168,37 +491,28 @@ def download_and_update_hf():
         )
         FilePaths.conus_hydrofabric.unlink()
 
+    # the size and ETag of the tarball are already known from checking for updates
+    status, headers = get_headers()
+
     download_from_s3(
         FilePaths.conus_hydrofabric.with_suffix(".tar.gz"),
         bucket="communityhydrofabric",
         key="hydrofabrics/community/conus_nextgen.tar.gz",
+        extract_dir=FilePaths.conus_hydrofabric.parent,
+        headers=headers if status == 200 else None,
     )
 
-    if FilePaths.hydrofabric_graph.is_file():
-        console.print(
-            f"Hydrofabric graph already exists at {FilePaths.hydrofabric_graph}, removing it to download the latest version.",
-            style="bold yellow",
-        )
-        FilePaths.hydrofabric_graph.unlink()
-
     download_from_s3(
         FilePaths.hydrofabric_graph,
         bucket="communityhydrofabric",
         key="hydrofabrics/community/conus_igraph_network.gpickle",
     )
 
-    status, headers = get_headers()
-
     if status == 200:
         # write headers to a file
         with open(FilePaths.hydrofabric_download_log, "w") as f:
             json.dump(dict(headers), f)
 
-    decompress_gzip_tar(
-        FilePaths.conus_hydrofabric.with_suffix(".tar.gz"),
-        FilePaths.conus_hydrofabric.parent,
-    )
-
 
 def validate_hydrofabric():
     if not FilePaths.conus_hydrofabric.is_file():
@@ -217,6 +531,15 @@ def validate_hydrofabric():
         # skip the updates
         return
 
+    if not FilePaths.hydrofabric_download_log.is_file():
+        # if the hydrofabric was extracted from a tarball that is still the latest version
+        # the version log can be recreated without downloading anything
+        status, latest_headers = _cached_head(hydrofabric_url)
+        local_etag = get_local_etag(FilePaths.conus_hydrofabric.with_suffix(".tar.gz"))
+        if status == 200 and local_etag and local_etag == latest_headers.get("ETag", ""):
+            with open(FilePaths.hydrofabric_download_log, "w") as f:
+                json.dump(dict(latest_headers), f)
+
     if not FilePaths.hydrofabric_download_log.is_file():
         response = Prompt.ask(
             "Hydrofabric version information unavailable, Would you like to fetch the updated version?",
@@ -231,20 +554,18 @@ def validate_hydrofabric():
                 f"To disable this warning, create an empty file called {FilePaths.no_update_hf.resolve()}",
                 style="bold yellow",
             )
-            sleep(2)
             return
 
     with open(FilePaths.hydrofabric_download_log, "r") as f:
         content = f.read()
         headers = json.loads(content)
 
-    status, latest_headers = get_headers()
+    status, latest_headers = _cached_head(hydrofabric_url)
 
     if status != 200:
         console.print(
             "Unable to contact servers, proceeding without updating hydrofabric", style="bold red"
         )
-        sleep(2)
 
     if headers.get("ETag", "") != latest_headers.get("ETag", ""):
         console.print("Local and remote Hydrofabric Differ", style="bold yellow")
@@ -265,21 +586,32 @@ def validate_hydrofabric():
                 f"To disable this warning, create an empty file called {FilePaths.no_update_hf.resolve()}",
                 style="bold yellow",
             )
-            sleep(2)
             return
 
     # moved this from gpkg_utils to here to avoid potential nested rich live displays
     if FilePaths.conus_hydrofabric.is_file():
-        valid_hf = False
-        while not valid_hf:
+        # imported here as gpkg_utils loads numpy, pyproj and shapely which the cli doesn't always need
+        from data_processing.gpkg_utils import verify_indices
+
+        attempts = 0
+        while True:
             try:
                 verify_indices()
-                valid_hf = True
+                break
             except sqlite3.DatabaseError:
+                if attempts >= HF_DOWNLOAD_ATTEMPTS:
+                    console.print(
+                        f"Hydrofabric {FilePaths.conus_hydrofabric} is still corrupted after {attempts} downloads, exiting...",
+                        style="bold red",
+                    )
+                    exit()
+                attempts += 1
                 console.print(
                     f"Hydrofabric {FilePaths.conus_hydrofabric} is corrupted. Redownloading...",
                     style="red",
                 )
+                # don't trust the recorded ETag, the tarball is rehashed before it's reused
+                FilePaths.conus_hydrofabric.with_suffix(".tar.gz.etag").unlink(missing_ok=True)
                 download_and_update_hf()
 
 
@@ -298,8 +630,11 @@ def validate_output_dir():
 
 
 def validate_all():
-    validate_hydrofabric()
+    if not FilePaths.no_update_hf.exists():
+        # send the update check's HEAD request while the output directory is checked
+        threading.Thread(target=get_headers, daemon=True).start()
     validate_output_dir()
+    validate_hydrofabric()
 
 
 if __name__ == "__main__":
@@ -1,31 +1,36 @@
 from flask import Flask
 import logging
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from map_app.views import main, intra_module_db
-from data_sources.source_validation import validate_all
+from map_app.views import main
 
 LOG_PATH = Path.home() / ".ngiab" / "app.log"
 
-with open(LOG_PATH, "w") as f:
-    f.write("")
-    f.write("Starting Application!\n")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(name)-12s: %(levelname)s - %(message)s",
-    filename=LOG_PATH,
-    filemode="a",
-)  # Append mode
 # Example: Adding a console handler to root logger (optional)
 console_handler = logging.StreamHandler()
 console_handler.setLevel(logging.INFO)  # Or any other level
 formatter = logging.Formatter("%(name)-12s: %(levelname)-8s %(message)s")
 console_handler.setFormatter(formatter)
-logging.getLogger("").addHandler(console_handler)
 
-validate_all()
+_logging_configured = False
+
+
+def _setup_logging():
+    # called when the app is started rather than on import, safe to call more than once
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+
+    # keep the logs from previous runs rather than truncating, capped at a few MB
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(name)-12s: %(levelname)s - %(message)s",
+        handlers=[RotatingFileHandler(LOG_PATH, maxBytes=1_000_000, backupCount=3)],
+    )
+    logging.getLogger("").addHandler(console_handler)
+    logging.getLogger(__name__).info("Starting Application!")
+
 
 app = Flask(__name__)
 app.register_blueprint(main)
-
-intra_module_db["app"] = app
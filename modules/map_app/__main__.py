@@ -2,13 +2,14 @@
 ## It is the entry point for the application and is equivalent to run.sh
 import logging
 import webbrowser
-from threading import Timer
+from threading import Thread, Timer
 from pathlib import Path
 
 from data_processing.file_paths import FilePaths
 from data_processing.graph_utils import get_graph
+from data_sources.source_validation import validate_all
 
-from map_app import app, console_handler
+from map_app import _setup_logging, app, console_handler
 
 LOG_PATH = Path.home() / ".ngiab" / "app.log"
 
@@ -22,6 +23,9 @@ def open_browser():
             if "Running on http" in line:
                 port_number = line.split(":")[-1].strip()
                 break
+            # the log is kept between runs, don't pick up the port of a previous one
+            if "Running in production mode" in line:
+                break
     if port_number is not None:
         webbrowser.open(f"http://localhost:{port_number}")
     else:
@@ -35,8 +39,11 @@ def set_logs_to_warning():
 
 
 def main():
-    # call this once to cache the graph
-    Timer(1, get_graph).start()
+    _setup_logging()
+    validate_all()
+
+    # load the graph in the background while the server starts, requests that need it wait for it
+    Thread(target=get_graph, daemon=True).start()
 
     if FilePaths.dev_file.is_file():
         Timer(2, set_logs_to_warning).start()
@@ -58,6 +58,7 @@ function updateProgressBar(percent) {
     barText.textContent = percent + "%";
 }
 
+let forcingsProgressInterval = null;
 function pollForcingsProgress(progressFile) {
     const interval = setInterval(() => {
         fetch('/forcings_progress', {
@@ -89,6 +90,32 @@ function pollForcingsProgress(progressFile) {
                 clearInterval(interval);
             });
     }, 1000); // Poll every second
+    forcingsProgressInterval = interval;
+}
+
+// resolves once a background job started by the server finishes, rejects if it fails
+function pollJob(job_id) {
+    return new Promise((resolve, reject) => {
+        const interval = setInterval(() => {
+            fetch(`/jobs/${job_id}`)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.state === 'running') {
+                        return;
+                    }
+                    clearInterval(interval);
+                    if (job.state === 'done') {
+                        resolve();
+                    } else {
+                        reject(new Error(job.error || 'job ' + job.state));
+                    }
+                })
+                .catch(error => {
+                    clearInterval(interval);
+                    reject(error);
+                });
+        }, 1000);
+    });
 }
 
 async function forcings() {
@@ -121,6 +148,7 @@ async function forcings() {
             var source = nwm_aorc ? 'aorc' : 'nwm';
             console.log('source:', source);
 
+            // the job is only started once the progress polling is, so a failure always has an interval to clear
             fetch('/make_forcings_progress_file', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
@@ -129,15 +157,18 @@ async function forcings() {
             .then(async (response) => response.text())
             .then(progressFile => {
                 pollForcingsProgress(progressFile); // Start polling for progress
+                return fetch('/forcings', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ 'forcing_dir': forcing_dir, 'start_time': start_time, 'end_time': end_time , 'source': source}),
+                });
             })
-            fetch('/forcings', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ 'forcing_dir': forcing_dir, 'start_time': start_time, 'end_time': end_time , 'source': source}),
-            })
-            .then(response => response.text())
+            .then(response => response.json())
+            .then(job => pollJob(job.job_id))
             .catch(error => {
                 console.error('Error:', error);
+                clearInterval(forcingsProgressInterval);
+                document.getElementById('forcings-output-path').textContent = "Failed to generate forcings";
             }).finally(() => {
                 document.getElementById('forcings-button').disabled = false;
             });
@@ -168,12 +199,14 @@ async function realization() {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ 'forcing_dir': forcing_dir, 'start_time': start_time, 'end_time': end_time }),
-    }).then(response => response.text())
-        .then(response_code => {
+    }).then(response => response.json())
+        .then(job => pollJob(job.job_id))
+        .then(() => {
             document.getElementById('realization-output-path').textContent = "Realization generated";
         })
         .catch(error => {
             console.error('Error:', error);
+            document.getElementById('realization-output-path').textContent = "Failed to generate realization";
         }).finally(() => {
             document.getElementById('realization-button').disabled = false;
         });
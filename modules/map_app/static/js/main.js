@@ -139,40 +139,38 @@ function update_map(cat_id, e) {
   var subset_type = nexus_catchment ? 'catchment' : 'nexus';
   console.log('subset_type:', subset_type);
 
-  if (subset_type == 'catchment') {
-    fetch('/get_upstream_catids', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify(cat_id),
-    })
-    .then(response => response.json())
-    .then(data => {
-      map.setFilter('upstream-catchments', ['any', ['in', 'divide_id', ...data]]);
-      if (data.length === 0) {
-        new maplibregl.Popup()
-          .setLngLat(e.lngLat)
-          .setHTML('No upstreams')
-          .addTo(map);
-      }
-    });
-  } else {
-    fetch('/get_upstream_wbids', {
+  get_upstreams(cat_id, subset_type).then(data => {
+    map.setFilter('upstream-catchments', ['any', ['in', 'divide_id', ...data]]);
+    if (data.length === 0) {
+      new maplibregl.Popup()
+        .setLngLat(e.lngLat)
+        .setHTML('No upstreams')
+        .addTo(map);
+    }
+  });
+}
+
+// the upstreams are kept per catchment and subset type, so switching back to a
+// subset type that's already been shown doesn't go back to the server
+const upstream_cache = {};
+function get_upstreams(cat_id, subset_type) {
+  const key = `${cat_id}|${subset_type}`;
+  if (!(key in upstream_cache)) {
+    const url = subset_type == 'catchment' ? '/get_upstream_catids' : '/get_upstream_wbids';
+    upstream_cache[key] = fetch(url, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(cat_id),
     })
     .then(response => response.json())
-    .then(data => {
-      map.setFilter('upstream-catchments', ['any', ['in', 'divide_id', ...data]]);
-      if (data.length === 0) {
-        new maplibregl.Popup()
-          .setLngLat(e.lngLat)
-          .setHTML('No upstreams')
-          .addTo(map);
-      }
+    .catch(error => {
+      delete upstream_cache[key];
+      throw error;
     });
   }
+  return upstream_cache[key];
 }
+
 let lastClickedLngLat = null; 
 map.on('click', 'catchments', (e) => {
   cat_id = e.features[0].properties.divide_id;
@@ -3,7 +3,10 @@ import logging
 from datetime import datetime
 from pathlib import Path
 import os
-import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from time import monotonic
+from uuid import uuid4
 
 import geopandas as gpd
 from data_processing.create_realization import create_realization
@@ -11,54 +14,72 @@ from data_processing.dataset_utils import save_and_clip_dataset
 from data_processing.datasets import load_aorc_zarr, load_v3_retrospective_zarr
 from data_processing.file_paths import FilePaths
 from data_processing.forcings import create_forcings
-from data_processing.graph_utils import get_upstream_cats, get_upstream_ids
+from data_processing.graph_utils import get_upstream_ids
 from data_processing.subset import subset
-from flask import Blueprint, jsonify, render_template, request
+from flask import Blueprint, current_app, render_template, request
+
+try:
+    # parses the request bytes directly, without decoding them to a str first
+    import orjson
+except ImportError:
+    orjson = None
 
 main = Blueprint("main", __name__)
-intra_module_db = {}
+intra_module_db = {"jobs": {}}
+# long running requests are run here and polled with /jobs/<job_id>, rather than holding the request open
+job_executor = ThreadPoolExecutor(max_workers=2)
+# finished jobs are dropped once polled, or after this many seconds if they never are
+JOB_TTL = 3600
 
 logger = logging.getLogger(__name__)
 
 
+def _loads(req):
+    if orjson is not None:
+        return orjson.loads(req.data)
+    return json.loads(req.data.decode("utf-8"))
+
+
+def _json(obj, status=200):
+    body = orjson.dumps(obj) if orjson is not None else json.dumps(obj)
+    return current_app.response_class(body, status=status, mimetype="application/json")
+
+
 @main.route("/")
 def index():
     return render_template("index.html")
 
-# this subset does not include the downstream nexus
-@main.route("/get_upstream_catids", methods=["POST"])
-def get_upstream_catids():
-    cat_id = json.loads(request.data.decode("utf-8"))
+@lru_cache(maxsize=1024)
+def _upstream_cat_ids(cat_id, include_outlet):
     # give wb_id to get_upstream_cats because the graph search is 1000x faster
     wb_id = "wb-" + cat_id.split("-")[-1]
-    upstream_cats = get_upstream_ids(wb_id, include_outlet=False)
+    upstream_cats = get_upstream_ids(wb_id, include_outlet=include_outlet)
     cleaned_upstreams = set()
     for id in upstream_cats:
         if id.startswith("wb-"):
             cleaned_upstreams.add("cat-" + id.split("-")[-1])
     if cat_id in cleaned_upstreams:
         cleaned_upstreams.remove(cat_id)
-    return list(cleaned_upstreams), 200
+    # cached results are shared, so don't hand out a mutable set
+    return tuple(cleaned_upstreams)
+
+# this subset does not include the downstream nexus
+@main.route("/get_upstream_catids", methods=["POST"])
+def get_upstream_catids():
+    cat_id = _loads(request)
+    return _json(_upstream_cat_ids(cat_id, False))
 
 # this subset includes the downstream nexus
 @main.route("/get_upstream_wbids", methods=["POST"])
 def get_upstream_wbids():
-    cat_id = json.loads(request.data.decode("utf-8"))
-    # give wb_id to get_upstream_cats because the graph search is 1000x faster
-    wb_id = "wb-" + cat_id.split("-")[-1]
-    upstream_cats = get_upstream_ids(wb_id)
-    cleaned_upstreams = set()
-    for id in upstream_cats:
-        if id.startswith("wb-"):
-            cleaned_upstreams.add("cat-" + id.split("-")[-1])
-    if cat_id in cleaned_upstreams:
-        cleaned_upstreams.remove(cat_id)
-    return list(cleaned_upstreams), 200
+    cat_id = _loads(request)
+    return _json(_upstream_cat_ids(cat_id, True))
 
 
 @main.route("/subset_check", methods=["POST"])
 def subset_check():
-    cat_ids = list(json.loads(request.data.decode("utf-8")))
+    # body: JSON.stringify([cat_id]), already a list once parsed
+    cat_ids = _loads(request)
     logger.info(cat_ids)
     subset_name = cat_ids[0]
     run_paths = FilePaths(subset_name)
@@ -71,7 +92,7 @@ def subset_check():
 @main.route("/subset", methods=["POST"])
 def subset_selection():
     #body: JSON.stringify({ 'cat_id': [cat_id], 'subset_type': subset_type})
-    data = json.loads(request.data.decode("utf-8"))
+    data = _loads(request)
     cat_ids = data.get("cat_id")
     subset_type = data.get("subset_type")
     logger.info(cat_ids)
@@ -89,7 +110,8 @@ def subset_selection():
 @main.route("/subset_to_file", methods=["POST"])
 def subset_to_file():
     raise NotImplementedError
-    cat_ids = list(json.loads(request.data.decode("utf-8")).keys())
+    # body: {cat_id: ...}, the keys are the selected catchments
+    cat_ids = list(_loads(request))
     logger.info(cat_ids)
     subset_name = cat_ids[0]
     total_subset = get_upstream_ids(cat_ids)
@@ -102,7 +124,7 @@ def subset_to_file():
 
 @main.route("/make_forcings_progress_file", methods=["POST"])
 def make_forcings_progress_file():
-    data = json.loads(request.data.decode("utf-8"))
+    data = _loads(request)
     subset_gpkg = Path(data.split("subset to ")[-1])
     paths = FilePaths(subset_gpkg.stem.split("_")[0])
     paths.forcing_progress_file.parent.mkdir(parents=True, exist_ok=True)
@@ -112,7 +134,7 @@ def make_forcings_progress_file():
 
 @main.route("/forcings_progress", methods=["POST"])
 def forcings_progress_endpoint():
-    progress_file = Path(json.loads(request.data.decode("utf-8")))
+    progress_file = Path(_loads(request))
     with open(progress_file, "r") as f:
         forcings_progress = json.load(f)
     forcings_progress_all = forcings_progress['total_steps']
@@ -137,10 +159,46 @@ def download_forcings(data_source, start_time, end_time, paths):
 def compute_forcings(cached_data, paths):
     create_forcings(cached_data, paths.output_dir.stem)  # type: ignore
 
+
+def run_forcings(data_source, start_time, end_time, paths):
+    try:
+        cached_data = download_forcings(data_source, start_time, end_time, paths)
+        compute_forcings(cached_data, paths)
+    except Exception:
+        logger.exception("Failed to create forcings")
+        raise
+
+
+def submit_job(fn, *args):
+    jobs = intra_module_db["jobs"]
+    now = monotonic()
+    for old_id, (submitted, job) in list(jobs.items()):
+        if job.done() and now - submitted > JOB_TTL:
+            jobs.pop(old_id, None)
+    job_id = uuid4().hex
+    jobs[job_id] = (now, job_executor.submit(fn, *args))
+    return job_id
+
+
+@main.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    entry = intra_module_db["jobs"].get(job_id)
+    if entry is None:
+        return _json({"state": "unknown"}, status=404)
+    _, job = entry
+    if not job.done():
+        return _json({"state": "running"})
+    # the final state is only reported once, the client stops polling after it
+    intra_module_db["jobs"].pop(job_id, None)
+    error = job.exception()
+    if error is not None:
+        return _json({"state": "error", "error": str(error)})
+    return _json({"state": "done"})
+
 @main.route("/forcings", methods=["POST"])
 def get_forcings():
     # body: JSON.stringify({'forcing_dir': forcing_dir, 'start_time': start_time, 'end_time': end_time}),
-    data = json.loads(request.data.decode("utf-8"))
+    data = _loads(request)
     subset_gpkg = Path(data.get("forcing_dir").split("subset to ")[-1])
     output_folder = Path(subset_gpkg.parent.parent)
     paths = FilePaths(output_dir=output_folder)
@@ -153,25 +211,17 @@ def get_forcings():
     # get the forcings
     start_time = datetime.strptime(start_time, "%Y-%m-%dT%H:%M")
     end_time = datetime.strptime(end_time, "%Y-%m-%dT%H:%M")
-    # logger.info(intra_module_db)
-    app = intra_module_db["app"]
-    debug_enabled = app.debug
-    app.debug = False
-    logger.debug(f"get_forcings() disabled debug mode at {datetime.now()}")
     logger.debug(f"forcing_dir: {output_folder}")
-    app.debug = debug_enabled
 
-    cached_data = download_forcings(data_source, start_time, end_time, paths)
-    # threading implemented so that main process can periodically poll progress file
-    thread = threading.Thread(target=compute_forcings,
-                              args=(cached_data, paths))
-    thread.start()
-    return "started", 200
+    # the download and zonal stats run in the background, the client polls the progress file
+    # and the job status
+    job_id = submit_job(run_forcings, data_source, start_time, end_time, paths)
+    return _json({"job_id": job_id})
 
 @main.route("/realization", methods=["POST"])
 def get_realization():
     # body: JSON.stringify({'forcing_dir': forcing_dir, 'start_time': start_time, 'end_time': end_time}),
-    data = json.loads(request.data.decode("utf-8"))
+    data = _loads(request)
     subset_gpkg = Path(data.get("forcing_dir").split("subset to ")[-1])
     output_folder = subset_gpkg.parent.parent.stem
     start_time = data.get("start_time")
@@ -179,8 +229,8 @@ def get_realization():
     # get the forcings
     start_time = datetime.strptime(start_time, "%Y-%m-%dT%H:%M")
     end_time = datetime.strptime(end_time, "%Y-%m-%dT%H:%M")
-    create_realization(output_folder, start_time, end_time)
-    return "success", 200
+    job_id = submit_job(create_realization, output_folder, start_time, end_time)
+    return _json({"job_id": job_id})
 
 
 @main.route("/get_catids_from_vpu", methods=["POST"])
@@ -188,18 +238,38 @@ def get_catids_from_vpu():
     raise NotImplementedError
 
 
+def tail_filter(path, n, exclude, chunk_size=64 * 1024):
+    """Last n lines of a file that don't contain exclude, newest first, reading from the end"""
+    exclude = exclude.encode()
+    result = []
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        # the start of the earliest block read so far, which may be part of a line
+        partial = b""
+        while position > 0 and len(result) < n:
+            read_size = min(chunk_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + partial).split(b"\n")
+            partial = lines.pop(0)
+            for line in reversed(lines):
+                # match the universal newlines of reading in text mode
+                line = line.rstrip(b"\r")
+                if line and exclude not in line:
+                    result.append(line)
+                    if len(result) >= n:
+                        break
+        partial = partial.rstrip(b"\r")
+        if len(result) < n and partial and exclude not in partial:
+            result.append(partial)
+    return [line.decode("utf-8", errors="replace") + "\n" for line in result]
+
+
 @main.route("/logs", methods=["GET"])
 def get_logs():
     log_file_path = Path.home() / ".ngiab" / "app.log"
     try:
-        with open(log_file_path, "r") as file:
-            lines = file.readlines()
-            reversed_lines = []
-            for line in reversed(lines):
-                if "werkzeug" not in line:
-                    reversed_lines.append(line)
-                if len(reversed_lines) > 100:
-                    break
-            return jsonify({"logs": reversed_lines}), 200
+        # only the end of the log is read, however large it has grown
+        return _json({"logs": tail_filter(log_file_path, 100, "werkzeug")})
     except Exception:
-        return jsonify({"error": "unable to fetch logs"})
+        return _json({"error": "unable to fetch logs"})
@@ -1,10 +1,12 @@
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 import rich.status
 
 # add a status bar for these imports so the cli feels more responsive
 with rich.status.Status("loading") as status:
     import argparse
+    import hashlib
+    import json
     import logging
     import subprocess
     import sys
@@ -12,29 +14,19 @@ with rich.status.Status("loading") as status:
     from multiprocessing import cpu_count
     from pathlib import Path
 
-    import geopandas as gpd
-    from data_processing.create_realization import (
-        create_dhbv2_realization,
-        create_lstm_realization,
-        create_realization,
-        create_summa_realization,
-    )
-    from data_processing.dask_utils import shutdown_cluster
-    from data_processing.dataset_utils import save_and_clip_dataset
-    from data_processing.datasets import load_aorc_zarr, load_v3_retrospective_zarr
     from data_processing.file_paths import FilePaths
-    from data_processing.forcings import create_forcings
-    from data_processing.gpkg_utils import get_cat_from_gage_id, get_catid_from_point
-    from data_processing.graph_utils import get_upstream_cats
-    from data_processing.subset import subset, subset_vpu
-    from data_sources.source_validation import validate_hydrofabric, validate_output_dir
     from ngiab_data_cli.arguments import parse_arguments
     from ngiab_data_cli.custom_logging import set_logging_to_critical_only, setup_logging
 
+# the processing modules pull in geopandas, xarray, dask etc. which take seconds to import
+# so they're imported by the steps that use them, --help and unused steps never load them
+
 
 def validate_input(args: argparse.Namespace) -> Tuple[str, str]:
     """Validate input arguments."""
 
+    from data_sources.source_validation import validate_hydrofabric, validate_output_dir
+
     feature_name = None
     output_folder = None
 
@@ -73,6 +65,8 @@ def validate_input(args: argparse.Namespace) -> Tuple[str, str]:
             logging.info(f"Found {feature_name} from {input_feature}")
         elif args.gage:
             validate_hydrofabric()
+            from data_processing.gpkg_utils import get_cat_from_gage_id
+
             feature_name = get_cat_from_gage_id(input_feature)
             logging.info(f"Found {feature_name} from {input_feature}")
         else:
@@ -94,12 +88,46 @@ def validate_input(args: argparse.Namespace) -> Tuple[str, str]:
 def get_cat_id_from_lat_lon(input_feature: str) -> str:
     """Read catchment IDs from input file or return single ID."""
     if "," in input_feature:
+        from data_processing.gpkg_utils import get_catid_from_point
+
         coords = input_feature.split(",")
         return get_catid_from_point({"lat": float(coords[0]), "lng": float(coords[1])})
     else:
         raise ValueError("Lat Lon input must be comma separated e.g. -l 54.33,-69.4")
 
 
+def get_cached_upstreams(
+    paths: FilePaths, feature: str, include_outlet: Optional[bool] = None
+) -> List[str]:
+    """
+    Upstream ids of feature, cached in the output folder so repeat runs don't need to load the graph.
+    include_outlet None returns the catchment ids from get_upstream_cats, otherwise the
+    graph node ids from get_upstream_ids. The cache is keyed on the hydrofabric's mtime.
+    """
+    hydrofabric = FilePaths.conus_hydrofabric
+    version = hydrofabric.stat().st_mtime_ns if hydrofabric.exists() else 0
+    key = hashlib.blake2b(
+        f"{version}|{feature}|{include_outlet}".encode(), digest_size=16
+    ).hexdigest()
+    cache_file = paths.metadata_dir / "upstream_cache" / f"{key}.json"
+    if cache_file.exists():
+        with open(cache_file, "r") as f:
+            return json.load(f)
+
+    with rich.status.Status("loading"):
+        from data_processing.graph_utils import get_upstream_cats, get_upstream_ids
+    if include_outlet is None:
+        upstreams = sorted(get_upstream_cats(feature))
+    else:
+        upstreams = sorted(get_upstream_ids(feature, include_outlet))
+    # an empty result is usually a missing feature, don't keep it
+    if upstreams:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "w") as f:
+            json.dump(upstreams, f)
+    return upstreams
+
+
 def set_dependent_flags(args, paths: FilePaths):
     # if validate is set, run everything that is missing
     if args.validate:
@@ -141,6 +169,7 @@ def validate_run_directory(args, paths: FilePaths):
 
 def main() -> None:
     setup_logging()
+    pull_process = None
     try:
         args = parse_arguments()
         if args.debug:
@@ -162,10 +191,30 @@ def main() -> None:
         paths = FilePaths(output_folder)
         paths.append_cli_command(sys.argv)
         args = set_dependent_flags(args, paths)  # --validate
+        if args.run:
+            # pull the image in the background while subsetting and forcings run
+            # docker only writes a line or two to stderr, so the pipe can't fill up in the meantime
+            try:
+                pull_process = subprocess.Popen(
+                    ["docker", "pull", "awiciroh/ciroh-ngen-image:latest"],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.PIPE,
+                )
+            except OSError:
+                logging.error("Docker could not be found, please install Docker and try again.")
+        include_outlet = True
+        if args.gage or args.subset_type == "catchment":
+            include_outlet = False
+        upstream_ids = None
         if feature_to_subset:
             logging.info(f"Processing {feature_to_subset} in {paths.output_dir}")
             if not args.vpu:
-                upstream_count = len(get_upstream_cats(feature_to_subset))
+                if args.subset:
+                    # walk the graph once and hand the result to subset rather than walking it again
+                    upstream_ids = get_cached_upstreams(paths, feature_to_subset, include_outlet)
+                    upstream_count = sum(1 for id in upstream_ids if id.startswith("wb-"))
+                else:
+                    upstream_count = len(get_cached_upstreams(paths, feature_to_subset))
                 logging.info(f"Upstream catchments: {upstream_count}")
                 if upstream_count == 0:
                     # if there are no upstreams, exit
@@ -173,24 +222,29 @@ def main() -> None:
                     return
 
         if args.subset:
+            with rich.status.Status("loading"):
+                from data_processing.subset import subset, subset_vpu
             if args.vpu:
                 logging.info(f"Subsetting VPU {args.vpu}")
                 subset_vpu(args.vpu, output_gpkg_path=paths.geopackage_path)
                 logging.info("Subsetting complete.")
             else:
                 logging.info("Subsetting hydrofabric")
-                include_outlet = True
-                if args.gage or args.subset_type == "catchment":
-                    include_outlet = False
                 subset(
                     feature_to_subset,
                     output_gpkg_path=paths.geopackage_path,
                     include_outlet=include_outlet,
+                    upstream_ids=upstream_ids,
                 )
                 logging.info("Subsetting complete.")
 
         if args.forcings:
             logging.info(f"Generating forcings from {args.start_date} to {args.end_date}...")
+            with rich.status.Status("loading"):
+                import geopandas as gpd
+                from data_processing.dataset_utils import save_and_clip_dataset
+                from data_processing.datasets import load_aorc_zarr, load_v3_retrospective_zarr
+                from data_processing.forcings import create_forcings
             if args.source == "aorc":
                 data = load_aorc_zarr(args.start_date.year, args.end_date.year)
             elif args.source == "nwm":
@@ -206,6 +260,13 @@ def main() -> None:
 
         if args.realization:
             logging.info(f"Creating realization from {args.start_date} to {args.end_date}...")
+            with rich.status.Status("loading"):
+                from data_processing.create_realization import (
+                    create_dhbv2_realization,
+                    create_lstm_realization,
+                    create_realization,
+                    create_summa_realization,
+                )
             gage_id = None
             if args.gage:
                 gage_id = args.input_feature
@@ -244,10 +305,12 @@ def main() -> None:
         if args.run:
             logging.info("Running Next Gen using NGIAB...")
 
-            try:
-                subprocess.run("docker pull awiciroh/ciroh-ngen-image:latest", shell=True)
-            except:
-                logging.error("Docker is not running, please start Docker and try again.")
+            if pull_process:
+                _, pull_errors = pull_process.communicate()
+                if pull_process.returncode != 0:
+                    logging.error(
+                        f"Failed to pull the NGIAB image, is Docker running? {pull_errors.decode().strip()}"
+                    )
             try:
                 command = f'docker run --rm -it -v "{str(paths.subset_dir)}:/ngen/ngen/data" awiciroh/ciroh-ngen-image:latest /ngen/ngen/data/ auto {cpu_count()} local'
                 subprocess.run(command, shell=True)
@@ -295,7 +358,16 @@ def main() -> None:
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
         raise
-    shutdown_cluster()
+    finally:
+        # don't leave the pull running if we returned or failed before docker run
+        if pull_process is not None and pull_process.returncode is None:
+            pull_process.terminate()  # does nothing if it's already finished
+            pull_process.communicate()
+    # a cluster can only have been started if one of the steps imported dask
+    if "dask.distributed" in sys.modules:
+        from data_processing.dask_utils import shutdown_cluster
+
+        shutdown_cluster()
 
 
 if __name__ == "__main__":
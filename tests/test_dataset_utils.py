@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from data_processing.dataset_utils import coordinate_slice
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize(
+    "start, stop",
+    [(2.0, 5.0), (5.0, 2.0), (1.5, 5.5), (-10.0, 100.0), (20.0, 30.0), (3.0, 3.0)],
+)
+def test_coordinate_slice(descending, start, stop):
+    values = np.arange(0.0, 10.0)
+    if descending:
+        values = values[::-1]
+    low, high = min(start, stop), max(start, stop)
+    expected = values[(values >= low) & (values <= high)]
+    np.testing.assert_array_equal(values[coordinate_slice(values, start, stop)], expected)
@@ -0,0 +1,38 @@
+import struct
+
+import pytest
+from shapely.geometry import Point
+
+from data_processing.gpkg_utils import blob_to_centre_point, blob_to_geometry
+
+
+def make_blob(point: Point, big_endian: bool = False, empty: bool = False) -> bytes:
+    """Build a geopackage binary blob with an xy envelope around a point."""
+    byte_order = ">" if big_endian else "<"
+    # envelope type 1 (xy) in bits 1-3, endianness in bit 0, empty flag in bit 4
+    flags = (1 << 1) | int(big_endian) | (int(empty) << 4)
+    header = b"GP" + bytes([0, flags]) + struct.pack(f"{byte_order}i", 5070)
+    envelope = struct.pack(f"{byte_order}4d", point.x, point.x, point.y, point.y)
+    return header + envelope + point.wkb
+
+
+@pytest.mark.parametrize("big_endian", [False, True])
+def test_blob_to_centre_point(big_endian):
+    point = Point(1234.5, -678.25)
+    centre = blob_to_centre_point(make_blob(point, big_endian=big_endian))
+    assert centre is not None
+    assert centre.equals(point)
+
+
+@pytest.mark.parametrize("big_endian", [False, True])
+def test_blob_to_geometry(big_endian):
+    point = Point(10.0, 20.0)
+    geometry = blob_to_geometry(make_blob(point, big_endian=big_endian))
+    assert geometry is not None
+    assert geometry.equals(point)
+
+
+def test_empty_blob():
+    blob = make_blob(Point(0, 0), empty=True)
+    assert blob_to_geometry(blob) is None
+    assert blob_to_centre_point(blob) is None
@@ -0,0 +1,46 @@
+import pytest
+
+from map_app.views import tail_filter
+
+
+def expected_tail(text: str, n: int, exclude: str):
+    """What reading the whole file in text mode and filtering it gives."""
+    lines = [line for line in reversed(text.splitlines()) if line and exclude not in line]
+    return [line + "\n" for line in lines[:n]]
+
+
+LOG = "".join(
+    f"{'werkzeug' if i % 3 == 0 else 'data_processing'}: INFO - line {i}\n" for i in range(50)
+)
+
+
+# small chunk sizes split lines across block boundaries
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 64 * 1024])
+@pytest.mark.parametrize("n", [1, 5, 100])
+def test_tail_filter(tmp_path, chunk_size, n):
+    log = tmp_path / "app.log"
+    log.write_text(LOG)
+    assert tail_filter(log, n, "werkzeug", chunk_size=chunk_size) == expected_tail(
+        LOG, n, "werkzeug"
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_tail_filter_crlf(tmp_path, chunk_size):
+    log = tmp_path / "app.log"
+    log.write_bytes(LOG.replace("\n", "\r\n").encode())
+    assert tail_filter(log, 100, "werkzeug", chunk_size=chunk_size) == expected_tail(
+        LOG, 100, "werkzeug"
+    )
+
+
+def test_tail_filter_no_trailing_newline(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("first\nwerkzeug: GET /logs\nlast")
+    assert tail_filter(log, 10, "werkzeug", chunk_size=4) == ["last\n", "first\n"]
+
+
+def test_tail_filter_empty(tmp_path):
+    log = tmp_path / "app.log"
+    log.write_text("")
+    assert tail_filter(log, 10, "werkzeug") == []
@@ -0,0 +1,84 @@
+import hashlib
+import io
+import os
+import tarfile
+
+import pytest
+
+from data_sources.source_validation import extract_tar_stream, file_matches_etag
+
+MB = 1024 * 1024
+
+
+def multipart_etag(data: bytes, part_size: int) -> str:
+    parts = [data[i : i + part_size] for i in range(0, len(data), part_size)]
+    combined = hashlib.md5(b"".join(hashlib.md5(part).digest() for part in parts))
+    return f'"{combined.hexdigest()}-{len(parts)}"'
+
+
+@pytest.mark.parametrize("size", [0, 1, MB + 1])
+def test_file_matches_single_part_etag(tmp_path, size):
+    data = os.urandom(size)
+    path = tmp_path / "file"
+    path.write_bytes(data)
+    assert file_matches_etag(path, f'"{hashlib.md5(data).hexdigest()}"')
+    assert not file_matches_etag(path, f'"{hashlib.md5(data + b"x").hexdigest()}"')
+
+
+@pytest.mark.parametrize("size, part_size", [(5 * MB // 2, MB), (3 * MB, MB), (5 * MB, 2 * MB)])
+def test_file_matches_multipart_etag(tmp_path, size, part_size):
+    data = os.urandom(size)
+    path = tmp_path / "file"
+    path.write_bytes(data)
+    assert file_matches_etag(path, multipart_etag(data, part_size))
+    assert not file_matches_etag(path, multipart_etag(data[:-1] + bytes([data[-1] ^ 1]), part_size))
+
+
+def make_tar(*members) -> io.BytesIO:
+    """Build an uncompressed tar from (TarInfo, data) pairs."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for info, data in members:
+            if data is not None:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+            else:
+                tar.addfile(info)
+    buffer.seek(0)
+    return buffer
+
+
+def test_extract_tar_stream(tmp_path):
+    small, large = b"small file", os.urandom(17 * MB)
+    archive = make_tar(
+        (tarfile.TarInfo("data/small.txt"), small),
+        (tarfile.TarInfo("data/nested/large.bin"), large),
+    )
+    extract_tar_stream(archive, tmp_path)
+    assert (tmp_path / "data" / "small.txt").read_bytes() == small
+    assert (tmp_path / "data" / "nested" / "large.bin").read_bytes() == large
+
+
+@pytest.mark.parametrize("name", ["../escaped.txt", "data/../../escaped.txt", "/tmp/escaped.txt"])
+def test_extract_tar_stream_rejects_escaping_paths(tmp_path, name):
+    output_dir = tmp_path / "output"
+    archive = make_tar((tarfile.TarInfo(name), b"escaped"))
+    with pytest.raises(tarfile.TarError):
+        extract_tar_stream(archive, output_dir)
+    assert not (tmp_path / "escaped.txt").exists()
+
+
+def test_extract_tar_stream_skips_links(tmp_path):
+    symlink = tarfile.TarInfo("data/link")
+    symlink.type = tarfile.SYMTYPE
+    symlink.linkname = "/etc/passwd"
+    hardlink = tarfile.TarInfo("data/hardlink")
+    hardlink.type = tarfile.LNKTYPE
+    hardlink.linkname = "data/file.txt"
+    archive = make_tar(
+        (tarfile.TarInfo("data/file.txt"), b"contents"), (symlink, None), (hardlink, None)
+    )
+    extract_tar_stream(archive, tmp_path)
+    assert (tmp_path / "data" / "file.txt").read_bytes() == b"contents"
+    assert not os.path.lexists(tmp_path / "data" / "link")
+    assert not os.path.lexists(tmp_path / "data" / "hardlink")